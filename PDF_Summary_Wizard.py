@@ -1,37 +1,49 @@
-import pymupdf
-import datetime
+import json
+import multiprocessing
+import os
+import queue
+import sqlite3
+import sys
 import time
 import tkinter as tk
 from threading import Event, Thread
 from tkinter import ttk
 from tkinter import filedialog, messagebox, Text, scrolledtext
 from pathlib import Path
-from pymupdf import Point, Matrix, Rect, Quad
-
-class MyRect(Rect):
-    def expand_rect(self, pix=18):
-        return MyRect(self[0] - pix, self[1] - pix, self[2] + pix, self[3] + pix)
-    
-    def center(self):
-        return Point((self[0] + self[2]) / 2, (self[1] + self[3]) / 2)
-
-    def fits_on_printer_paper(self):
-        return ((min(self.width, self.height) < 6.75 * 72) and (max(self.width, self.height) < 9.25 * 72))
-    
-def merge_overlapping_rects(list_of_rects):
-    final_rects = [list_of_rects.pop()]
-
-    while len(list_of_rects) > 0:
-        current_rect = list_of_rects.pop()
-        sorted = False
-        for final_rect in final_rects:
-            if final_rect.intersects(current_rect):
-                final_rect = final_rect.include_rect(current_rect)
-                sorted = True
-        if not sorted:
-            final_rects.append(current_rect)
-    
-    return final_rects
+
+# Wall clock time the script got going, for the startup report
+STARTED_AT = time.time()
+
+# The engine brings pymupdf with it, which is slow to load (and slower still
+# to unpack and virus-scan in a frozen build), so it is only imported once
+# the first page is on screen; see import_engine().
+summary_wizard = None
+
+# Set by benchmarks/startup.py: where to write the startup timings, and when it launched us
+STARTUP_REPORT_ENV = "PDF_SUMMARY_STARTUP_REPORT"
+LAUNCHED_AT_ENV = "PDF_SUMMARY_LAUNCHED_AT"
+
+
+def import_engine():
+    global summary_wizard
+    import summary_wizard
+    return summary_wizard
+
+
+def startup_timings(first_page_at, engine_at):
+    """Seconds from launch to the first page drawn and to the engine loaded.
+
+    Launch is the time ``benchmarks/startup.py`` passed in, which covers a
+    frozen build unpacking itself, or else when this script started running.
+    """
+    launched_at = float(os.environ.get(LAUNCHED_AT_ENV) or STARTED_AT)
+    return {
+        "since": "launch" if os.environ.get(LAUNCHED_AT_ENV) else "script start",
+        "script_start": round(STARTED_AT - launched_at, 4),
+        "first_page": round(first_page_at - launched_at, 4),
+        "engine": round(engine_at - launched_at, 4),
+        "frozen": bool(getattr(sys, "frozen", False)),
+    }
 
 class PlaceholderEntry(tk.Entry):
     def __init__(self, container, placeholder, color='grey', *args, **kwargs):
@@ -56,22 +68,114 @@ class PlaceholderEntry(tk.Entry):
             self.delete(0, tk.END)
             self.configure(fg=self.default_fg_color)
 
+class BackgroundTask:
+    """Runs ``target(progress, cancel, publish)`` on a worker thread and hands its events back to the Tk loop.
+
+    Tk widgets may only be touched from the main thread, so the worker only
+    puts events on a queue and ``widget.after()`` drains it every ``poll_ms``.
+    Anything the worker passes to ``publish`` arrives at ``on_items`` in order.
+    The callbacks are plain attributes, so a task started by one page can be
+    handed over to the next one, as long as ``widget`` outlives both.
+    """
+    def __init__(self, widget, target, on_progress=None, on_items=None, on_done=None, on_error=None, on_cancelled=None, poll_ms=50):
+        self.widget = widget
+        self.on_progress = on_progress
+        self.on_items = on_items
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancelled = on_cancelled
+        self.poll_ms = poll_ms
+
+        self.cancel_event = Event()
+        self.events = queue.Queue()
+        self.finished = False
+
+        self.thread = Thread(target=self._run, args=(target,), daemon=True)
+        self.thread.start()
+        self.widget.after(self.poll_ms, self._poll)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _run(self, target):
+        try:
+            result = target(self._progress, self.cancel_event, self._publish)
+        except summary_wizard.SummaryCancelled:
+            self.events.put(("cancelled", None))
+        except Exception as e:
+            self.events.put(("error", e))
+        else:
+            self.events.put(("done", result))
+
+    def _progress(self, stage, done, total):
+        self.events.put(("progress", (stage, done, total)))
+
+    def _publish(self, items):
+        self.events.put(("items", items))
+
+    def _poll(self):
+        if not self.widget.winfo_exists():
+            self.cancel()
+            return
+
+        latest_progress = None
+        while True:
+            try:
+                kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+
+            if kind == "progress":
+                latest_progress = payload
+                continue
+
+            if kind == "items":
+                if self.on_items is not None:
+                    self.on_items(payload)
+                continue
+
+            # Let the bar catch up before handing over to the finishing callback
+            if latest_progress is not None and self.on_progress is not None:
+                self.on_progress(*latest_progress)
+
+            self.finished = True
+
+            if kind == "cancelled":
+                if self.on_cancelled is not None:
+                    self.on_cancelled()
+            else:
+                callback = self.on_done if kind == "done" else self.on_error
+                if callback is not None:
+                    callback(payload)
+            return
+
+        if latest_progress is not None and self.on_progress is not None:
+            self.on_progress(*latest_progress)
+
+        self.widget.after(self.poll_ms, self._poll)
+
 class WizardApp(tk.Tk):
     def __init__(self):
         super().__init__()
         self.title("Drawing File Processor Wizard")
-        self.geometry("700x400")
+        self.geometry("900x600")
 
         self.state_dict = dict()
         
         # Data storage to pass between pages
         self.selected_file = tk.StringVar()
-        self.process_method = tk.StringVar(value="Summary")
+        self.process_method = tk.StringVar(value="Summary Report")
+        # Filled in with the engine's default on the options page
+        self.density = tk.StringVar()
+        # Off unless asked for, like --incremental on the command line, since it leaves a .regions.json beside the summary
+        self.incremental = tk.BooleanVar(value=False)
 
         self.container = tk.Frame(self)
         self.container.pack(fill="both", expand=True, padx=20, pady=20)
 
         self.page_rects = dict()
+        self.doc = None
+        self.scan_task = None
 
         # Start at the first page
         self.show_page(FileSelectionPage)
@@ -84,6 +188,14 @@ class WizardApp(tk.Tk):
         page = page_class(self.container, self)
         page.pack(fill="both", expand=True)
 
+    def open_scan_result(self, result):
+        """Keep the document and page rects handed back by a finished annotation scan."""
+        if self.doc is not None:
+            self.doc.close()
+        self.doc, total_doc_annots, self.page_rects = result
+        self.scan_task = None
+        return total_doc_annots
+
 # --- Page 1: File Selection ---
 class FileSelectionPage(tk.Frame):
     def __init__(self, parent, controller):
@@ -96,6 +208,7 @@ class FileSelectionPage(tk.Frame):
         self.file_label.pack(pady=5)
 
         ttk.Button(self, text="Browse...", command=self.browse_file).pack(pady=10)
+        ttk.Button(self, text="Summarize a whole folder...", command=self.browse_folder).pack(pady=10)
         
         # Navigation
         ttk.Button(self, text="Next >", command=self.next_step).pack(side="bottom", anchor="e")
@@ -107,6 +220,12 @@ class FileSelectionPage(tk.Frame):
             self.controller.state_dict['chosen_file'] = filename
             self.file_label.config(text='.../' + '/'.join(filename.split("/")[-2:]), fg="black")
 
+    def browse_folder(self):
+        folder = filedialog.askdirectory()
+        if folder:
+            self.controller.state_dict['chosen_folder'] = folder
+            self.controller.show_page(BatchProcessing)
+
     def next_step(self):
         if not self.controller.selected_file.get():
             messagebox.showwarning("Error", "Please select a file first!")
@@ -123,82 +242,156 @@ class ImportingAnnotations(tk.Frame):
         tk.Label(self, text="Importing annotations...", font=("Arial", 12, "bold")).pack(pady=10)
 
         # Navigation
-        self.next = ttk.Button(self, text="Next >", command=self.next_step)
-        self.next.pack(side="bottom", anchor="e")
+        nav = tk.Frame(self)
+        nav.pack(side="bottom", fill="x")
+
+        self.next = ttk.Button(nav, text="Next >", command=self.next_step)
+        self.next.pack(side="right")
         self.next["state"] = "disabled"
-        
-        # self.console = tk.Text(self, font=("Helvetica", 10), wrap="word", height=100, width=200, state='disabled')
-        # # self
-        # self.console.pack(padx=10, pady=12)
+
+        self.cancel_button = ttk.Button(nav, text="Cancel", command=self.cancel)
+        self.cancel_button.pack(side="left")
+
         self.progress = ttk.Progressbar(self, orient="horizontal", length = 500, mode="determinate")
         self.progress.pack(pady=20)
 
+        self.status = tk.Label(self, text="", fg="gray")
+        self.status.pack()
 
-        time.sleep(0.2)
-        total_doc_annots = self.find_all_annots_in_pdf(self.controller.state_dict['chosen_file'])
-        
-        self.controller.state_dict["doc_annots"] = total_doc_annots
-        
-        time.sleep(0.2)
-        self.next["state"] = "normal"
-        tk.Label(self, text = "Done!", font=("Arial", 12, "bold")).pack(pady=10)
-        time.sleep(0.3)
-
-        self.controller.show_page(FilterAnnotations)
-    
-    # def finish(self):
-    #     file = self.controller.selected_file.get()
-    #     action = self.controller.process_method.get()
-    #     messagebox.showinfo("Processing", f"Processing {file}\nUsing method: {action}")
-    #     self.controller.destroy()
+        # Polled from the app rather than this page so the scan can carry on
+        # while FilterAnnotations shows the annotations found so far
+        file_path = self.controller.state_dict['chosen_file']
+        self.task = BackgroundTask(self.controller, lambda progress, cancel, publish: self.find_all_annots_in_pdf(file_path, progress, cancel, publish),
+                                   on_progress=self.update_progress, on_items=self.first_annotations, on_done=self.scan_finished,
+                                   on_error=self.scan_failed, on_cancelled=self.scan_cancelled)
 
     def next_step(self):
         self.controller.show_page(FilterAnnotations)
 
-    def find_all_annots_in_pdf(self, file_path):
-        try:
-            self.controller.doc = pymupdf.open(file_path)
-        except Exception as e:
-            print(f"Big issue arrose: {e}")
-            raise e
-        
-        total_pages = self.controller.doc.page_count
+    def cancel(self):
+        self.cancel_button["state"] = "disabled"
+        self.status.config(text="Cancelling...")
+        self.task.cancel()
 
-        total_doc_annots = []
-        
-        for page_number in range(total_pages):
-            self.progress.configure(value= ((page_number * 100) // total_pages))
-
-            page = self.controller.doc[page_number]
+    def find_all_annots_in_pdf(self, file_path, progress=None, cancel=None, publish=None):
+        # Runs on the worker thread, so it must not touch any widgets
+        doc = summary_wizard.open_document(file_path)
+        try:
+            cache = summary_wizard.AnnotationCache()
+        except (OSError, sqlite3.Error):
+            # A read-only profile just means every run scans from scratch
+            cache = None
 
-            self.controller.page_rects[page_number] = page.rect
+        try:
+            total_doc_annots, page_rects = summary_wizard.find_all_annots_in_pdf(doc, progress=progress, cancel=cancel, cache=cache, on_page=publish)
+        except BaseException:
+            doc.close()
+            raise
+        finally:
+            if cache is not None:
+                cache.close()
+
+        return doc, total_doc_annots, page_rects
+
+    def update_progress(self, stage, done, total):
+        self.progress.configure(value=((done * 100) // max(total, 1)))
+        self.status.config(text=f"Page {done} of {total}")
+
+    def first_annotations(self, records):
+        # Hand the running scan over to the filter page, which keeps adding rows
+        self.controller.state_dict["doc_annots"] = records
+        self.controller.scan_task = self.task
+        self.controller.show_page(FilterAnnotations)
 
-            annots = list(page.annots())
-            print(page.number)
+    def scan_finished(self, result):
+        self.controller.state_dict["doc_annots"] = self.controller.open_scan_result(result)
 
+        self.next["state"] = "normal"
+        self.controller.show_page(FilterAnnotations)
 
-            if len(annots) > 0:
-                print(f"pg. {page.number + 1} - {annots[0].info['content']=}")
+    def scan_failed(self, error):
+        messagebox.showerror("Error", f"Could not read annotations from this file:\n{error}")
+        self.controller.show_page(FileSelectionPage)
 
+    def scan_cancelled(self):
+        self.controller.show_page(FileSelectionPage)
 
-                for annot in annots:
-                    annot_dict = dict()
-                    annot_dict["page_no"] = page_number
-                    annot_dict["page_label"] = page.get_label()
-                    annot_dict["id"] = annot.info['id']
-                    annot_dict["author"] = annot.info['title']
-                    annot_dict["stroke_color"] = annot.colors['stroke']
+    def destroy(self):
+        if self.controller.scan_task is not self.task:
+            self.task.cancel()
+        super().destroy()
 
-                    modif_time = datetime.datetime.strptime(annot.info['modDate'].replace("'", ""), r"D:%Y%m%d%H%M%S%z")
 
-                    annot_dict["last_modified"] = modif_time
-                    
-                    annot_dict["raw_annot"] = annot
+class VirtualTreeview(tk.Frame):
+    """A Treeview that only holds the rows currently on screen.
 
-                    total_doc_annots.append(annot_dict)
+    ``rows`` can be any sequence; ``row_item(row)`` turns one into the
+    ``(image, values)`` shown for it. Scrolling reuses the same handful of
+    Treeview items, so the cost of a refresh doesn't depend on the row count.
+    """
+    def __init__(self, parent, columns, row_item, **kwargs):
+        super().__init__(parent)
+        self.row_item = row_item
+        self.rows = []
+        self.offset = 0
+        self.visible = 1
+
+        self.tree = ttk.Treeview(self, columns=columns, show="tree headings", **kwargs)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree.pack(side="left", fill="both", expand=True)
+
+        self.row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+
+        self.tree.bind("<Configure>", self._resize)
+        self.tree.bind("<MouseWheel>", lambda e: self.yview("scroll", -1 if e.delta > 0 else 1, "units"))
+        self.tree.bind("<Button-4>", lambda e: self.yview("scroll", -1, "units"))
+        self.tree.bind("<Button-5>", lambda e: self.yview("scroll", 1, "units"))
+
+    def set_rows(self, rows):
+        self.rows = rows
+        self.offset = 0
+        self.refresh()
+
+    def extend_rows(self, rows):
+        self.rows.extend(rows)
+        self.refresh()
+
+    def yview(self, *args):
+        if args[0] == "moveto":
+            offset = int(float(args[1]) * len(self.rows))
+        else:
+            step = self.visible if args[2] == "pages" else 3
+            offset = self.offset + int(args[1]) * step
+        self.offset = max(0, min(offset, len(self.rows) - self.visible))
+        self.refresh()
+
+    def _resize(self, event):
+        # Leave room for the heading row
+        visible = max(1, event.height // self.row_height - 1)
+        if visible != self.visible:
+            self.visible = visible
+            self.offset = max(0, min(self.offset, len(self.rows) - self.visible))
+            self.refresh()
+
+    def refresh(self):
+        items = self.tree.get_children()
+        shown = self.rows[self.offset:self.offset + self.visible]
+
+        for i, row in enumerate(shown):
+            image, values = self.row_item(row)
+            if i < len(items):
+                self.tree.item(items[i], image=image, values=values)
+            else:
+                self.tree.insert("", "end", image=image, values=values)
 
-        return total_doc_annots
+        if len(items) > len(shown):
+            self.tree.delete(*items[len(shown):])
 
+        if self.rows:
+            self.scrollbar.set(self.offset / len(self.rows), (self.offset + len(shown)) / len(self.rows))
+        else:
+            self.scrollbar.set(0, 1)
 
 # --- Page 3: Processing Options ---
 class FilterAnnotations(tk.Frame):
@@ -209,15 +402,13 @@ class FilterAnnotations(tk.Frame):
         tk.Label(self, text="Filter document annotations", font=("Arial", 12, "bold")).pack(pady=10)
         tk.Label(self, text="Click [next] without selecting any filters to export all filters.", fg="gray", justify="left").pack(pady=5)
 
-        # self.all_elements = [
-        #     {"id": 1, "author": "Alice", "date": "2023-01-01", "page": 5},
-        #     {"id": 2, "author": "Bob", "date": "2023-02-15", "page": 12},
-        #     {"id": 3, "author": "Alice", "date": "2023-03-10", "page": 2},
-        #     {"id": 4, "author": "Charlie", "date": "2023-01-20", "page": 45},
-        # ]
+        # The index keeps records in an AnnotationStore; index.records[i] gives the record dict:
+        # {"page_no", "page_label", "id", "author", "stroke_color", "last_modified", "content", "subject", "bbox"}
+        self.index = summary_wizard.AnnotationIndex(self.controller.state_dict["doc_annots"])
+        self.criteria = summary_wizard.FilterCriteria()
 
-        self.all_elements = self.controller.state_dict["doc_annots"]
-        # Dict of the layout: {"page_no", "page_label", "id", "author", "last_modified", "raw_annot"}
+        # One 16x16 swatch per stroke colour, shared by every row using it
+        self.swatches = dict()
 
         # Sidebar (Left) and Results (Right)
         self.sidebar = tk.Frame(self, width=200, bg="#f0f0f0", padx=10, pady=10)
@@ -226,108 +417,333 @@ class FilterAnnotations(tk.Frame):
         self.main_area = tk.Frame(self, padx=10, pady=10)
         self.main_area.pack(side="right", fill="both", expand=True)
 
-        # (Author Dropdown)
+        # (Comment text, searched through the index's full-text search as you type)
+        tk.Label(self.sidebar, text="Search comments:", bg="#f0f0f0").pack(anchor="w")
+        self.search_box = PlaceholderEntry(self.sidebar, placeholder='e.g. RFI clash "C-4"')
+        self.search_box.pack(fill="x", pady=5)
+        self.search_box.bind("<KeyRelease>", self.search_typed)
+        self.search_pending = None
+
+        # (Author list, several can be selected; none selected means all)
         tk.Label(self.sidebar, text="Filter by Author:", bg="#f0f0f0").pack(anchor="w")
-        self.author_var = tk.StringVar(value="All")
-        authors = ["All"] + list(set(e["author"] for e in self.all_elements))
-        self.author_menu = ttk.Combobox(self.sidebar, textvariable=self.author_var, values=authors)
-        self.author_menu.pack(fill="x", pady=5)
-        self.author_menu.bind("<<ComboboxSelected>>", self.apply_filters)
+        self.author_list = tk.Listbox(self.sidebar, selectmode="multiple", height=5, exportselection=False)
+        self.author_list.pack(fill="x", pady=5)
+        self.author_list.bind("<<ListboxSelect>>", self.apply_filters)
+
+        # (Colour list)
+        tk.Label(self.sidebar, text="Filter by Color:", bg="#f0f0f0").pack(anchor="w")
+        self.color_list = tk.Listbox(self.sidebar, selectmode="multiple", height=4, exportselection=False)
+        self.color_list.pack(fill="x", pady=5)
+        self.color_list.bind("<<ListboxSelect>>", self.apply_filters)
+
+        self.refresh_choices()
 
-        # (Page Dropdown)
+        # (Page numbers)
         tk.Label(self.sidebar, text="Page number: (default all)", bg="#f0f0f0").pack(anchor="w")
         self.page_selection = PlaceholderEntry(self.sidebar, placeholder="e.g. 2-6, 9, 12-16")
         self.page_selection.pack(fill="x", pady=5)
-        self.page_selection.bind("<FocusOut>", self.apply_filters)
 
-        # Results Table (Treeview)
-        self.tree = ttk.Treeview(self.main_area, columns=("page_no", "page_label", "author", "last_modified"), show="headings")
+        # (Page labels)
+        tk.Label(self.sidebar, text="Page label: (default all)", bg="#f0f0f0").pack(anchor="w")
+        self.label_selection = PlaceholderEntry(self.sidebar, placeholder="e.g. E101, E102")
+        self.label_selection.pack(fill="x", pady=5)
+
+        # (Date range)
+        tk.Label(self.sidebar, text="Modified between:", bg="#f0f0f0").pack(anchor="w")
+        self.date_from = PlaceholderEntry(self.sidebar, placeholder="e.g. 2025-01-31")
+        self.date_from.pack(fill="x", pady=2)
+        self.date_to = PlaceholderEntry(self.sidebar, placeholder="e.g. 2025-02-28")
+        self.date_to.pack(fill="x", pady=2)
+
+        for entry in (self.search_box, self.page_selection, self.label_selection, self.date_from, self.date_to):
+            entry.bind("<FocusOut>", self.apply_filters, add="+")
+            entry.bind("<Return>", self.apply_filters, add="+")
+
+        # Results Table (only the visible rows exist as Treeview items)
+        self.results = VirtualTreeview(self.main_area, ("page_no", "page_label", "author", "last_modified", "content"), self.row_item)
+        self.tree = self.results.tree
         self.tree.heading("#0", text="Color Sample")
         self.tree.heading("page_no", text="#")
         self.tree.heading("page_label", text="Page Label")
         self.tree.heading("author", text="Author")
         self.tree.heading("last_modified", text="Date Modified")
+        self.tree.heading("content", text="Comment")
 
         self.tree.column("#0", width=40, minwidth=40, stretch=tk.NO)
         self.tree.column("page_no", width=40, minwidth=40, stretch=tk.NO)
 
-        self.tree.pack(fill="both", expand=True)
+        self.results.pack(fill="both", expand=True)
 
-        
-        tk.Button(self.main_area, text="Next", command=self.next_step, bg="green", fg="white").pack(side="right", pady=10)
-        tk.Button(self.main_area, text="< Back", command=lambda: controller.show_page(FileSelectionPage)).pack(side="right", pady=10)
+        self.next = tk.Button(self.main_area, text="Next", command=self.next_step, bg="green", fg="white")
+        self.next.pack(side="right", pady=10)
+        tk.Button(self.main_area, text="< Back", command=self.back).pack(side="right", pady=10)
+
+        self.scan_status = tk.Label(self.main_area, text="", fg="gray")
+        self.scan_status.pack(side="left", pady=10)
 
         # Initial data load
         self.apply_filters()
 
-    def apply_filters(self, event=None):
-        # Clear the current view
-        self.image_list = []
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        # The scan may still be running; keep adding its annotations as they arrive
+        self.scan_task = self.controller.scan_task
+        if self.scan_task is not None:
+            self.next["state"] = "disabled"
+            self.scan_task.on_progress = self.scan_progress
+            self.scan_task.on_items = self.add_annotations
+            self.scan_task.on_done = self.scan_finished
+            self.scan_task.on_error = self.scan_failed
+            self.scan_task.on_cancelled = lambda: self.controller.show_page(FileSelectionPage)
+
+    def back(self):
+        if self.scan_task is not None and not self.scan_task.finished:
+            self.scan_task.cancel()
+        else:
+            self.controller.show_page(FileSelectionPage)
 
-        selected_author = self.author_var.get()
-        
-        page_filter_text = self.page_selection.get()
+    def scan_progress(self, stage, done, total):
+        self.scan_status.config(text=f"Still reading page {done} of {total}...")
 
+    def add_annotations(self, records):
+        positions = self.index.add(records)
+        self.refresh_choices()
+        self.results.extend_rows([position for position in positions if self.criteria.matches(self.index.records[position])])
 
-        if "e.g." in page_filter_text:
-            page_filter = "all"
-        else:
-            page_filter = set()
-            for statement in page_filter_text.split(","):
-                if "-" in statement:
-                    low = statement.split("-")[0]
-                    high = statement.split("-")[0]
-                    [page_filter.add(i) for i in range(int(low), int(high) + 1)]
-                else:
-                    page_filter.add(int(statement))
-        
+    def scan_finished(self, result):
+        # Keep the whole scan so coming back to this page lists everything
+        self.controller.state_dict["doc_annots"] = self.controller.open_scan_result(result)
+        self.scan_status.config(text=f"{len(self.index)} annotations")
+        self.next["state"] = "normal"
 
-        # Filter and Re-insert
-        for elem in self.all_elements:
+    def scan_failed(self, error):
+        messagebox.showerror("Error", f"Could not read annotations from this file:\n{error}")
+        self.controller.scan_task = None
+        self.controller.show_page(FileSelectionPage)
+
+    def refresh_choices(self):
+        """Add authors and colours that showed up since the lists were last filled."""
+        known_authors = self.author_list.get(0, tk.END)
+        for author in self.index.authors():
+            if author not in known_authors:
+                self.author_list.insert(tk.END, author)
+
+        known_colors = self.color_list.get(0, tk.END)
+        for color in self.index.colors():
+            if color not in known_colors:
+                self.color_list.insert(tk.END, color)
+                self.color_list.itemconfig(tk.END, background=color, selectbackground=color)
+
+    def swatch(self, color):
+        if color not in self.swatches:
             img = tk.PhotoImage(width=16, height=16)
-            if len(elem["stroke_color"]) != 0:
-                r,g,b = (int(channel * 255) for channel in elem["stroke_color"])
-                # print(elem["stroke_color"])
-                color = f"#{r:02x}{g:02x}{b:02x}"
-            else:
-                color = "#FFFFFF"
-
             img.put(color, to=(0,0,16,16))
+            self.swatches[color] = img
+        return self.swatches[color]
+
+    def row_item(self, position):
+        elem = self.index.records[position]
+        # Comments can run over several lines; the table shows them on one
+        content = " ".join((elem["content"] or "").split())
+        return self.swatch(summary_wizard.color_hex(elem["stroke_color"])), (elem["page_no"], elem["page_label"], elem["author"], elem["last_modified"], content)
+
+    def selected_filters(self):
+        authors = [self.author_list.get(i) for i in self.author_list.curselection()]
+        colors = [self.color_list.get(i) for i in self.color_list.curselection()]
+
+        try:
+            page_filter = summary_wizard.parse_page_filter(self.page_selection.get())
+        except ValueError:
+            page_filter = "all"
 
-            self.image_list.append(img)
+        try:
+            date_from = summary_wizard.parse_date_filter(self.date_from.get())
+            date_to = summary_wizard.parse_date_filter(self.date_to.get(), end_of_day=True)
+        except ValueError:
+            date_from = date_to = None
 
-            if (selected_author == "All" or elem["author"] == selected_author) and (page_filter == "all" or int(elem["page_no"]) in page_filter):
-                self.tree.insert("", "end",image=img, values=(elem["page_no"], elem["page_label"], elem["author"], elem["last_modified"]))
+        return summary_wizard.FilterCriteria(authors=authors, pages=page_filter, labels=summary_wizard.parse_label_filter(self.label_selection.get()),
+                                             colors=colors, date_from=date_from, date_to=date_to,
+                                             text=summary_wizard.parse_search_filter(self.search_box.get()))
 
+    def search_typed(self, event=None):
+        # Searching is quick, but wait for a pause in typing before refreshing the table
+        if self.search_pending is not None:
+            self.after_cancel(self.search_pending)
+        self.search_pending = self.after(250, self.apply_filters)
+
+    def apply_filters(self, event=None):
+        if self.search_pending is not None:
+            self.after_cancel(self.search_pending)
+            self.search_pending = None
+        self.criteria = self.selected_filters()
+        self.results.set_rows(self.index.query(self.criteria))
 
     def next_step(self):
-        self.controller.state_dict["filtered_doc_annots"] = []
-        
-        selected_author = self.author_var.get()
-        
-        page_filter_text = self.page_selection.get()
+        # The table can lag what is typed in the search box (or a filter not yet applied); summarize what is set now
+        self.apply_filters()
+        self.controller.state_dict["filtered_doc_annots"] = self.index.select(self.results.rows)
 
+        self.controller.show_page(ProcessingOptionsPage)
 
-        if "e.g." in page_filter_text:
-            page_filter = "all"
-        else:
-            page_filter = set()
-            for statement in page_filter_text.split(","):
-                if "-" in statement:
-                    low = statement.split("-")[0]
-                    high = statement.split("-")[0]
-                    [page_filter.add(i) for i in range(int(low), int(high) + 1)]
-                else:
-                    page_filter.add(int(statement))
-
-        for elem in self.all_elements:
-            if (selected_author == "All" or elem["author"] == selected_author) and (page_filter == "all" or int(elem["page_no"]) in page_filter):
-                self.controller.state_dict["filtered_doc_annots"].append(elem)
+class RegionPreview(tk.Frame):
+    """Shows the screenshot regions over page thumbnails before anything is written.
+
+    Regions are worked out on a worker thread and listed as they arrive. Only
+    the thumbnail slots on screen exist as canvas items; their thumbnails are
+    asked of a ``ThumbnailRenderer``, which renders them on its own thread
+    and keeps them in a bounded LRU, so scrolling back is instant and
+    hundreds of sheets cost no more than the few on screen.
+    """
+    # Slots either side of the visible ones whose thumbnails are rendered ahead of scrolling
+    READ_AHEAD = 4
 
+    def __init__(self, parent, controller):
+        super().__init__(parent)
+        self.controller = controller
+        self.slot_width = summary_wizard.THUMBNAIL_BOX[0] + 20
+        self.slot_height = summary_wizard.THUMBNAIL_BOX[1] + 40
+
+        tk.Label(self, text="Check the screenshot regions", font=("Arial", 12, "bold")).pack(pady=10)
+        self.status = tk.Label(self, text="Finding screenshot regions...", fg="gray")
+        self.status.pack()
+
+        nav = tk.Frame(self)
+        nav.pack(side="bottom", fill="x")
+        self.next = tk.Button(nav, text="Next", command=self.next_step, bg="green", fg="white")
+        self.next.pack(side="right", pady=10)
+        self.next["state"] = "disabled"
+        tk.Button(nav, text="< Back", command=self.back).pack(side="right", pady=10)
+
+        self.canvas = tk.Canvas(self, bg="#d9d9d9", highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self.scrolled)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+
+        self.canvas.bind("<Configure>", lambda e: self.refresh())
+        self.canvas.bind("<MouseWheel>", lambda e: self.canvas.yview_scroll(-1 if e.delta > 0 else 1, "units"))
+        self.canvas.bind("<Button-4>", lambda e: self.canvas.yview_scroll(-1, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self.canvas.yview_scroll(1, "units"))
+
+        # (page_no, page_label, screenshot rects) for each page, in order
+        self.pages = []
+        # PhotoImages of the slots on screen only; the renderer's cache holds the rest
+        self.images = dict()
+        # The slots drawn last and the scroll region, so unchanged ones aren't redone
+        self.shown = None
+        self.scrollregion = None
+
+        self.renderer = summary_wizard.ThumbnailRenderer(self.controller.state_dict['chosen_file'])
+        self.task = BackgroundTask(self, self.find_regions, on_items=self.add_pages, on_done=self.regions_finished,
+                                   on_error=self.regions_failed, on_cancelled=lambda: None)
+        self.after(50, self.poll_thumbnails)
+
+    def find_regions(self, progress, cancel, publish):
+        # Runs on the worker thread, so it must not touch any widgets
+        regions = summary_wizard.iter_regions(self.controller.doc, self.controller.state_dict["filtered_doc_annots"],
+                                              self.controller.page_rects, cancel=cancel)
+        for page_no, page_label, screenshot_dict in regions:
+            publish((page_no, page_label, list(screenshot_dict)))
+
+    def add_pages(self, page):
+        self.pages.append(page)
+        self.refresh()
+
+    def regions_finished(self, result):
+        region_count = sum(len(rects) for _, _, rects in self.pages)
+        self.status.config(text=f"{region_count} regions on {len(self.pages)} pages")
+        self.next["state"] = "normal"
+
+    def regions_failed(self, error):
+        messagebox.showerror("Error", f"Could not work out the screenshot regions:\n{error}")
+        self.back()
+
+    def columns(self):
+        return max(1, self.canvas.winfo_width() // self.slot_width)
+
+    def scrolled(self, first, last):
+        self.scrollbar.set(first, last)
+        self.refresh()
+
+    def visible_slots(self):
+        columns = self.columns()
+        top = self.canvas.canvasy(0)
+        first_row = max(0, int(top // self.slot_height))
+        last_row = int((top + self.canvas.winfo_height()) // self.slot_height)
+        return range(first_row * columns, min(len(self.pages), (last_row + 1) * columns)), columns
+
+    def refresh(self):
+        """Redraw the slots on screen and ask for their thumbnails."""
+        slots, columns = self.visible_slots()
+        rows = -(-len(self.pages) // columns)
+        scrollregion = (0, 0, columns * self.slot_width, rows * self.slot_height)
+        # Setting it, even to the same value, calls scrolled() again
+        if scrollregion != self.scrollregion:
+            self.scrollregion = scrollregion
+            self.canvas.configure(scrollregion=scrollregion)
+
+        wanted = range(max(0, slots.start - self.READ_AHEAD * columns), min(len(self.pages), slots.stop + self.READ_AHEAD * columns))
+        self.renderer.request([self.pages[i][0] for i in slots] + [self.pages[i][0] for i in wanted if i not in slots])
+
+        if (slots, columns) == self.shown:
+            return
+        self.shown = (slots, columns)
+        self.canvas.delete("slot")
+        images = dict()
+        for i in slots:
+            images.update(self.draw_slot(i, columns))
+        self.images = images
+
+    def draw_slot(self, i, columns):
+        page_no, page_label, rects = self.pages[i]
+        x = (i % columns) * self.slot_width + 10
+        y = (i // columns) * self.slot_height + 10
+        self.canvas.create_text(x, y, anchor="nw", tags="slot",
+                                text=f"{page_label or f'Page {page_no + 1}'}: {len(rects)} region{'s' if len(rects) != 1 else ''}")
+        y += 20
+
+        thumbnail = self.renderer.get(page_no)
+        if thumbnail is None:
+            box_width, box_height = summary_wizard.THUMBNAIL_BOX
+            text = "No preview" if page_no in self.renderer.failed else "Rendering..."
+            self.canvas.create_rectangle(x, y, x + box_width, y + box_height, fill="white", outline="#bbbbbb", tags="slot")
+            self.canvas.create_text(x + box_width / 2, y + box_height / 2, text=text, fill="gray", tags="slot")
+            return {}
+
+        image = self.images.get(page_no) or tk.PhotoImage(data=thumbnail.data, format="ppm")
+        self.canvas.create_image(x, y, image=image, anchor="nw", tags="slot")
+        for rect in rects:
+            self.canvas.create_rectangle(x + rect.x0 * thumbnail.zoom, y + rect.y0 * thumbnail.zoom,
+                                         x + rect.x1 * thumbnail.zoom, y + rect.y1 * thumbnail.zoom,
+                                         outline="#0078d7", width=2, tags="slot")
+        return {page_no: image}
+
+    def poll_thumbnails(self):
+        if not self.winfo_exists():
+            return
+        arrived = False
+        while True:
+            try:
+                self.renderer.ready.get_nowait()
+            except queue.Empty:
+                break
+            arrived = True
+        if arrived:
+            # New thumbnails only change the slots that were waiting for them
+            self.shown = None
+            self.refresh()
+        self.after(50, self.poll_thumbnails)
+
+    def back(self):
+        self.controller.show_page(ProcessingOptionsPage)
+
+    def next_step(self):
         self.controller.show_page(GeneratingScreenshots)
 
+    def destroy(self):
+        self.task.cancel()
+        self.renderer.close()
+        super().destroy()
+
 class GeneratingScreenshots(tk.Frame):
     def __init__(self, parent, controller):
         super().__init__(parent)
@@ -338,166 +754,189 @@ class GeneratingScreenshots(tk.Frame):
         self.progress = ttk.Progressbar(self, orient="horizontal", length = 500, mode="determinate")
         self.progress.pack(pady=20)
 
+        self.status = tk.Label(self, text="Finding screenshot regions...", font=("Arial", 12, "bold"))
+        self.status.pack(pady=10)
+
         self.next = tk.Button(self, text="Next", command=self.finish, bg="green", fg="white")
         self.next.pack(side="right")
         self.next["state"] = "disabled"
 
-        time.sleep(0.2)
-        total_doc_screenshots = self.generate_output()
-        
-        # self.controller.state_dict["total_doc_screenshots"] = total_doc_screenshots
-        
-        time.sleep(0.2)
-        # self.next["state"] = "normal"
-        tk.Label(self, text = "Writing output pdf...", font=("Arial", 12, "bold")).pack(pady=10)
-        time.sleep(0.3)
+        self.cancel_button = ttk.Button(self, text="Cancel", command=self.cancel)
+        self.cancel_button.pack(side="left")
 
-        self.write_output(total_doc_screenshots)
+        self.task = BackgroundTask(self, self.run, on_progress=self.update_progress, on_done=self.output_finished,
+                                   on_error=self.output_failed, on_cancelled=self.output_cancelled)
 
-        time.sleep(0.2)
-        tk.Label(self, text = "Done!", font=("Arial", 12, "bold")).pack(pady=10)
-        time.sleep(5)
-
-        self.finish()
+    def run(self, progress, cancel, publish):
+        # Runs on the worker thread, so it must not touch any widgets.
+        # Regions are generated as the writer consumes them, a page at a time.
+        self.write_output(progress, cancel)
 
+    def cancel(self):
+        self.cancel_button["state"] = "disabled"
+        self.status.config(text="Cancelling...")
+        self.task.cancel()
 
     def finish(self):
         file = self.controller.selected_file.get()
-        messagebox.showinfo("Summary generated", f"Input file {file}\nOutput file: {self.controller.state_dict['chosen_file'].split('.pdf')[0]}_summary.pdf")
+        messagebox.showinfo("Summary generated", f"Input file {file}\nOutput file: {summary_wizard.default_output_path(self.controller.state_dict['chosen_file'])}")
         self.controller.destroy()
 
-    def generate_output(self):
-        filtered_annots = self.controller.state_dict["filtered_doc_annots"]
-        total_doc_screenshots = []
-
-        unique_pages = {annot['page_no'] for annot in filtered_annots}
-        unique_annot_ids = {annot['id'] for annot in filtered_annots}
-        total_pages = len(unique_pages)
-
-        for page_number in unique_pages:
-            page = self.controller.doc[page_number]
-            all_annots = list(page.annots())
-
-            self.progress.configure(value= ((page_number * 50) // total_pages))
-
-            annots = []
-
-            for annot in all_annots:
-                if annot.info['id'] in unique_annot_ids:
-                    annots.append(annot)
-                # annot_dict["id"] = annot.info['id']
-
-            # for annot in annots:
-                
-            rect_groups = [[annots[0]]]
-
-            # Group together annotations that are close to each other
-            for i in range(1,len(annots)):
-                annot = annots[i]
-                added_to_group = False
-                annot_rect = MyRect(annot.apn_bbox)
-
-                for j in range(len(rect_groups)):
-                    group = rect_groups[j]
-                    for k in range(len(group)):
-                        rect = MyRect(group[k].apn_bbox)
-
-                        if annot_rect.expand_rect().intersects(rect.expand_rect()):
-                            group.append(annot)
-                            k = len(group) + 1
-                            j = len(rect_groups) + 10
-                
-                if j != len(rect_groups) + 10:
-                    rect_groups.append([annot])
-
-            # Make boundary rects that include all annots within their boundaries
-            boundary_rects = []
-            for rect_group in rect_groups:
-                surrounding_rect = MyRect(rect_group[0].apn_bbox)
-
-                if len(rect_group) > 0:
-                    for i in range(1, len(rect_group)):
-                        surrounding_rect = surrounding_rect.include_rect(rect_group[i].apn_bbox)
-                    
-                boundary_rects.append(surrounding_rect.expand_rect())
-
-            # Make a really immature grouping of annotations
-            screenshot_rects = boundary_rects.copy()
-
-            for i in range(30):
-                for j in range(len(screenshot_rects)):
-                    if screenshot_rects[j].fits_on_printer_paper():
-                        screenshot_rects[j] = screenshot_rects[j].expand_rect(pix=8)
-                
-                screenshot_rects = merge_overlapping_rects(screenshot_rects)
-
-            final_number = len(screenshot_rects)
-
-            screenshot_rects = boundary_rects.copy()
-            while len(screenshot_rects) > final_number:
-                
-                for j in range(len(screenshot_rects)):
-                    if screenshot_rects[j].fits_on_printer_paper():
-                        screenshot_rects[j] = screenshot_rects[j].expand_rect(pix=3).intersect(self.controller.page_rects[page_number])
-                
-                screenshot_rects = merge_overlapping_rects(screenshot_rects)
-
-            # Make a dictionary containing all the annotations and key information for this page
-            screenshot_dict = {rect: {"annot_ids": [], "authors": set(), "last_modified": -1, "portrait": True} for rect in screenshot_rects}
-
-
-            for annot in annots:
-                for screenshot_rect in screenshot_dict.keys():
-                    if annot.apn_bbox.intersects(screenshot_rect):
-                        screenshot_dict[screenshot_rect]["annot_ids"].append(annot.info['id'])
-                        screenshot_dict[screenshot_rect]["authors"].add(annot.info['title'])
-
-                        modif_time = datetime.datetime.strptime(annot.info['modDate'].replace("'", ""), r"D:%Y%m%d%H%M%S%z")
-
-                        if screenshot_dict[screenshot_rect]["last_modified"] == -1 or modif_time.timestamp() > screenshot_dict[screenshot_rect]["last_modified"].timestamp():
-                            screenshot_dict[screenshot_rect]["last_modified"] = modif_time
-
-                        if screenshot_rect.width > screenshot_rect.height:
-                            screenshot_dict[screenshot_rect]["portrait"] = False
-
-            total_doc_screenshots.append((page_number, page.get_label(), screenshot_dict))
-            # print(total_doc_screenshots)
-        return total_doc_screenshots
-    
-    def write_output(self,total_doc_screenshots):
-        page_size = pymupdf.paper_sizes()['letter']
-        output = pymupdf.open()
-
-        i = 0
-        
-        for page_no,page_label,screenshot_dict in total_doc_screenshots:
-            i += 0
-            self.progress.configure(value= (50 + (i * 50) // len(total_doc_screenshots)))
+    def write_output(self, progress=None, cancel=None):
+        filtered_doc_annots = self.controller.state_dict["filtered_doc_annots"]
+        output_path = summary_wizard.default_output_path(self.controller.state_dict['chosen_file'])
+        options = dict(progress=progress, cancel=cancel, workers=summary_wizard.default_workers(), density=self.controller.density.get())
+        if self.controller.incremental.get():
+            # Sheets unchanged since the last summary of this file are copied from it instead of rendered again
+            summary_wizard.write_incremental_summary(self.controller.doc, filtered_doc_annots, self.controller.page_rects, output_path, **options)
+            return
+        regions = summary_wizard.iter_regions(self.controller.doc, filtered_doc_annots, self.controller.page_rects, cancel=cancel)
+        summary_wizard.write_summary(self.controller.doc, regions, output_path, total=len(filtered_doc_annots.pages()), **options)
+
+    def update_progress(self, stage, done, total):
+        # Regions are found page by page as they are written, so only writing moves the bar
+        if stage != "write":
+            return
+        self.progress.configure(value=(done * 100) // max(total or 0, 1))
+        self.status.config(text=f"Writing output pdf... ({done} of {total} pages)")
+
+    def output_finished(self, result):
+        self.progress.configure(value=100)
+        self.status.config(text="Done!")
+        self.cancel_button["state"] = "disabled"
+        self.next["state"] = "normal"
+
+    def output_failed(self, error):
+        messagebox.showerror("Error", f"Could not write the summary:\n{error}")
+        self.controller.show_page(FilterAnnotations)
 
-            image_number = 0
-            for screenshot in screenshot_dict.keys():
-                image_number += 1
+    def output_cancelled(self):
+        self.controller.show_page(RegionPreview)
 
-                # screenshot_dict[screenshot]["authors"]
-                # screenshot_dict[screenshot]["last_modified"]
-                # screenshot_dict[screenshot]["portrait"]
+class BatchProcessing(tk.Frame):
+    """Summarizes every PDF in the chosen folder, resuming from the folder's manifest if there is one."""
+    def __init__(self, parent, controller):
+        super().__init__(parent)
+        self.controller = controller
+        self.folder = self.controller.state_dict['chosen_folder']
 
-                if screenshot_dict[screenshot]["portrait"]:
-                    new_page = output.new_page(width=page_size[0], height=page_size[1])
-                else:
-                    new_page = output.new_page(width=page_size[1], height=page_size[0])
+        tk.Label(self, text="Summarizing folder...", font=("Arial", 12, "bold")).pack(pady=10)
+        tk.Label(self, text=self.folder, fg="gray").pack()
 
-                new_page.insert_image(Rect((36,36),screenshot.width, screenshot.height), pixmap = self.controller.doc[page_no].get_pixmap(clip=screenshot,dpi=72))
+        self.progress = ttk.Progressbar(self, orient="horizontal", length = 500, mode="determinate")
+        self.progress.pack(pady=20)
 
-                r = pymupdf.Rect(30, min(screenshot.height + 10, new_page.mediabox[3] - 106), 210, 80)
+        self.status = tk.Label(self, text="Looking for PDFs...")
+        self.status.pack()
 
-                # new_page.draw_rect(r, color=[1,1,1], fill=[1,1,1])
+        nav = tk.Frame(self)
+        nav.pack(side="bottom", fill="x")
 
-                new_page.insert_text((36, min(screenshot.height + 20, new_page.mediabox[3] - 96)), f"{page_label}, image {image_number} of {len(screenshot_dict.keys())}")
-                new_page.insert_text((36, min(screenshot.height + 40, new_page.mediabox[3] - 76)), f"Annotation author: {', '.join(screenshot_dict[screenshot]['authors'])}")
-                new_page.insert_text((36, min(screenshot.height + 60, new_page.mediabox[3] - 56)), f"Annotation date: {screenshot_dict[screenshot]['last_modified'].strftime('%Y-%m-%d')}")
+        self.done_button = ttk.Button(nav, text="Done", command=self.controller.destroy)
+        self.done_button.pack(side="right")
+        self.done_button["state"] = "disabled"
 
-        output.save(self.controller.state_dict['chosen_file'].split(".pdf")[0] + "_summary.pdf")
+        self.cancel_button = ttk.Button(nav, text="Cancel", command=self.cancel)
+        self.cancel_button.pack(side="left")
+
+        self.results = scrolledtext.ScrolledText(self, height=15)
+        self.results.pack(fill="both", expand=True, pady=10)
+
+        self.task = BackgroundTask(self, self.run, on_progress=self.update_progress, on_items=self.file_finished,
+                                   on_done=self.batch_finished, on_error=self.batch_failed, on_cancelled=self.batch_cancelled)
+
+    def run(self, progress, cancel, publish):
+        # Runs on the worker thread, so it must not touch any widgets
+        inputs = summary_wizard.collect_inputs(self.folder)
+        manifest_path = str(Path(self.folder) / summary_wizard.MANIFEST_NAME)
+        manifest = summary_wizard.run_batch(inputs, manifest_path, jobs=summary_wizard.default_workers(), progress=progress,
+                                            cancel=cancel, on_file=lambda file_path, entry: publish((file_path, entry)))
+        return summary_wizard.batch_counts(manifest, inputs)
+
+    def cancel(self):
+        self.cancel_button["state"] = "disabled"
+        self.status.config(text="Cancelling after the files already started...")
+        self.task.cancel()
+
+    def update_progress(self, stage, done, total):
+        self.progress.configure(value=((done * 100) // max(total, 1)))
+        self.status.config(text=f"File {done} of {total}")
+
+    def file_finished(self, item):
+        file_path, entry = item
+        detail = "" if entry["status"] == "done" else f": {entry['error']}"
+        self.results.insert(tk.END, f"{entry['status']} - {Path(file_path).name}{detail}\n")
+        self.results.see(tk.END)
+
+    def batch_finished(self, counts):
+        self.progress.configure(value=100)
+        self.status.config(text=", ".join(f"{count} {status}" for status, count in sorted(counts.items())) or "No PDFs found")
+        self.cancel_button["state"] = "disabled"
+        self.done_button["state"] = "normal"
+
+    def batch_failed(self, error):
+        messagebox.showerror("Error", f"Could not summarize this folder:\n{error}")
+        self.controller.show_page(FileSelectionPage)
+
+    def batch_cancelled(self):
+        self.status.config(text="Cancelled. Run the folder again to pick up where it stopped.")
+        self.done_button["state"] = "normal"
+
+class ExportingAnnotations(tk.Frame):
+    """Writes the filtered annotations out as a comment log, without rendering anything."""
+    def __init__(self, parent, controller):
+        super().__init__(parent)
+        self.controller = controller
+        self.output_path = self.controller.state_dict["export_path"]
+
+        tk.Label(self, text="Exporting annotations...", font=("Arial", 12, "bold")).pack(pady=10)
+        tk.Label(self, text=self.output_path, fg="gray").pack()
+
+        self.progress = ttk.Progressbar(self, orient="horizontal", length = 500, mode="determinate")
+        self.progress.pack(pady=20)
+
+        self.status = tk.Label(self, text="Writing rows...")
+        self.status.pack()
+
+        nav = tk.Frame(self)
+        nav.pack(side="bottom", fill="x")
+
+        self.done_button = ttk.Button(nav, text="Done", command=self.controller.destroy)
+        self.done_button.pack(side="right")
+        self.done_button["state"] = "disabled"
+
+        self.cancel_button = ttk.Button(nav, text="Cancel", command=self.cancel)
+        self.cancel_button.pack(side="left")
+
+        self.task = BackgroundTask(self, self.run, on_progress=self.update_progress, on_done=self.export_finished,
+                                   on_error=self.export_failed, on_cancelled=self.export_cancelled)
+
+    def run(self, progress, cancel, publish):
+        # Runs on the worker thread, so it must not touch any widgets
+        return summary_wizard.export_records(self.controller.state_dict["filtered_doc_annots"], self.output_path,
+                                             progress=progress, cancel=cancel)
+
+    def cancel(self):
+        self.cancel_button["state"] = "disabled"
+        self.status.config(text="Cancelling...")
+        self.task.cancel()
+
+    def update_progress(self, stage, done, total):
+        self.progress.configure(value=(done * 100) // max(total or 0, 1))
+        self.status.config(text=f"{done} of {total} annotations written")
+
+    def export_finished(self, rows):
+        self.progress.configure(value=100)
+        self.status.config(text=f"Done! {rows} annotations written.")
+        self.cancel_button["state"] = "disabled"
+        self.done_button["state"] = "normal"
+
+    def export_failed(self, error):
+        messagebox.showerror("Error", f"Could not export the annotations:\n{error}")
+        self.controller.show_page(ProcessingOptionsPage)
+
+    def export_cancelled(self):
+        self.controller.show_page(ProcessingOptionsPage)
 
 # --- Page 2: Processing Options ---
 class ProcessingOptionsPage(tk.Frame):
@@ -512,18 +951,66 @@ class ProcessingOptionsPage(tk.Frame):
         for opt in options:
             tk.Radiobutton(self, text=opt, variable=self.controller.process_method, value=opt).pack(anchor="w")
 
+        # (Summary layout: one region per page, or several packed together)
+        density_frame = tk.Frame(self)
+        density_frame.pack(anchor="w", pady=10)
+        tk.Label(density_frame, text="Summary regions per page:").pack(side="left")
+        if not self.controller.density.get():
+            self.controller.density.set(summary_wizard.DEFAULT_DENSITY)
+        ttk.Combobox(density_frame, textvariable=self.controller.density, values=summary_wizard.DENSITIES, state="readonly", width=10).pack(side="left", padx=5)
+
+        # (Incremental update of an earlier summary of this file)
+        tk.Checkbutton(self, text="Only redraw sheets that changed since the last summary\n(keeps a .regions.json file next to the summary)",
+                       variable=self.controller.incremental, justify="left").pack(anchor="w")
+
         # Navigation
         btn_frame = tk.Frame(self)
         btn_frame.pack(side="bottom", fill="x")
         
-        tk.Button(btn_frame, text="< Back", command=lambda: controller.show_page(FileSelectionPage)).pack(side="left")
+        tk.Button(btn_frame, text="< Back", command=lambda: controller.show_page(FilterAnnotations)).pack(side="left")
         tk.Button(btn_frame, text="Next", command=self.finish, bg="green", fg="white").pack(side="right")
 
     def finish(self):
-        file = self.controller.selected_file.get()
         action = self.controller.process_method.get()
-        self.controller.destroy()
+        if action == "Summary Report":
+            self.controller.show_page(RegionPreview)
+        elif action == "Convert to CSV":
+            self.choose_export_path()
+        else:
+            messagebox.showinfo("Not available", f"{action} is not available yet.")
+
+    def choose_export_path(self):
+        chosen_file = self.controller.state_dict['chosen_file']
+        default_path = Path(summary_wizard.default_export_path(chosen_file, "csv"))
+        path = filedialog.asksaveasfilename(title="Export annotations", initialdir=default_path.parent, initialfile=default_path.name,
+                                            defaultextension=".csv",
+                                            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"), ("Excel workbook", "*.xlsx")])
+        if not path:
+            return
+        try:
+            summary_wizard.export_format_for(path)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.controller.state_dict["export_path"] = path
+        self.controller.show_page(ExportingAnnotations)
 
 if __name__ == "__main__":
+    # Render workers re-launch the frozen executable, which must not open another window
+    multiprocessing.freeze_support()
     app = WizardApp()
-    app.mainloop()
\ No newline at end of file
+    # Draw the first page before loading the engine; nothing on it needs pymupdf
+    app.update()
+    first_page_at = time.time()
+    import_engine()
+    summary_wizard.trace.enable_from_environment()
+    timings = startup_timings(first_page_at, time.time())
+    summary_wizard.trace.count("startup.first_page_ms", int(timings["first_page"] * 1000))
+
+    report_path = os.environ.get(STARTUP_REPORT_ENV)
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(timings, f)
+        app.destroy()
+    else:
+        app.mainloop()
\ No newline at end of file
@@ -27,7 +27,12 @@ exe = EXE(
     bootloader_ignore_signals=False,
     strip=False,
     upx=True,
-    upx_exclude=[],
+    # The big binaries take longest to decompress at every start, so leave them as they are.
+    # For a faster start still, build PDF_Summary_Wizard_fast.spec instead.
+    upx_exclude=[
+        '_mupdf.pyd', 'mupdfcpp64.dll', '_mupdf.so', 'libmupdf.so.26.12', 'libmupdfcpp.so.26.12',
+        'python3.dll', 'python311.dll', 'tcl86t.dll', 'tk86t.dll',
+    ],
     runtime_tmpdir=None,
     console=False,
     disable_windowed_traceback=False,
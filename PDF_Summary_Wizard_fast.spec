@@ -0,0 +1,55 @@
+# -*- mode: python ; coding: utf-8 -*-
+# Fast-start build: pyinstaller PDF_Summary_Wizard_fast.spec
+#
+# A one-folder build in dist/PDF_Summary_Wizard/ instead of the single
+# executable of PDF_Summary_Wizard.spec. The onefile build unpacks the whole
+# bundle to a temp folder on every launch, and antivirus scans every file it
+# writes there; the folder build starts straight from the installed files,
+# which are scanned once. Nothing is UPX-compressed: decompressing the large
+# MuPDF, Python and Tcl/Tk binaries at each start costs more than the disk it
+# saves, and packed binaries are what scanners look at hardest.
+#
+# Time a build with: python -m benchmarks.startup --exe dist/PDF_Summary_Wizard/PDF_Summary_Wizard.exe
+
+
+a = Analysis(
+    ['PDF_Summary_Wizard.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=[],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=[],
+    noarchive=False,
+    optimize=0,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='PDF_Summary_Wizard',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=False,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='PDF_Summary_Wizard',
+)
@@ -0,0 +1,56 @@
+"""Time and size of the summary written in each output mode.
+
+Run from the repository root with a marked-up drawing set:
+
+    python -m benchmarks.bench_output_modes drawings.pdf [--repeat 3]
+
+The scan and region search run once; only write_summary is timed, once per
+configuration, and the size of each summary is reported next to its time.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import summary_wizard
+
+CONFIGURATIONS = [
+    ("vector", dict(mode="vector")),
+    ("raster png 72 dpi", dict(mode="raster", dpi=72, image_format="png")),
+    ("raster jpeg 72 dpi", dict(mode="raster", dpi=72, image_format="jpeg")),
+    ("raster png 150 dpi", dict(mode="raster", dpi=150, image_format="png")),
+    ("raster jpeg 150 dpi", dict(mode="raster", dpi=150, image_format="jpeg")),
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="marked-up PDF to summarize")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per configuration; the fastest is reported")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="render processes for the raster modes")
+    args = parser.parse_args(argv)
+
+    doc = summary_wizard.open_document(args.input)
+    doc_annots, page_rects = summary_wizard.find_all_annots_in_pdf(doc)
+    regions = summary_wizard.generate_regions(doc, doc_annots, page_rects)
+    region_count = sum(len(screenshot_dict) for _, _, screenshot_dict in regions)
+    print(f"{args.input}: {len(doc_annots)} annotations, {region_count} regions")
+
+    print(f"{'configuration':<22} {'seconds':>8} {'size MB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, options in CONFIGURATIONS:
+            output_path = os.path.join(tmp, "summary.pdf")
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                summary_wizard.write_summary(doc, regions, output_path, workers=args.workers, **options)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            size = os.path.getsize(output_path) / (1024 * 1024)
+            print(f"{name:<22} {best:>8.2f} {size:>9.2f}")
+
+    doc.close()
+
+
+if __name__ == "__main__":
+    main()
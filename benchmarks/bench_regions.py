@@ -0,0 +1,101 @@
+"""Compare the old expand/merge region search with ``pack_regions``.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_regions [--sheets 200] [--groups 5 20 80 200]
+
+For each group count it times both approaches over the same random sheets and
+reports the average number of regions produced and how many of them are too
+big to print (the legacy merge ignores the paper size). The legacy loop has no upper
+bound on its second stage, so it is capped here and the sheets where it hit the
+cap are counted.
+"""
+import argparse
+import random
+import time
+
+from pymupdf import Rect
+
+from summary_wizard import MyRect, merge_overlapping_rects, pack_regions
+
+LEGACY_ITERATION_CAP = 2000
+
+# 36 x 24 inch E-size sheet
+SHEET = Rect(0, 0, 36 * 72, 24 * 72)
+
+
+def legacy_regions(boundary_rects, page_rect):
+    """The two-stage loop generate_output used before pack_regions."""
+    screenshot_rects = boundary_rects.copy()
+
+    for i in range(30):
+        for j in range(len(screenshot_rects)):
+            if screenshot_rects[j].fits_on_printer_paper():
+                screenshot_rects[j] = screenshot_rects[j].expand_rect(pix=8)
+
+        screenshot_rects = merge_overlapping_rects(screenshot_rects)
+
+    final_number = len(screenshot_rects)
+
+    screenshot_rects = boundary_rects.copy()
+    iterations = 0
+    while len(screenshot_rects) > final_number:
+        iterations += 1
+        if iterations > LEGACY_ITERATION_CAP:
+            return screenshot_rects, False
+
+        for j in range(len(screenshot_rects)):
+            if screenshot_rects[j].fits_on_printer_paper():
+                screenshot_rects[j] = screenshot_rects[j].expand_rect(pix=3).intersect(page_rect)
+
+        screenshot_rects = merge_overlapping_rects(screenshot_rects)
+
+    return screenshot_rects, True
+
+
+def random_groups(rnd, count):
+    """Boundary rects shaped like grouped clouds and callouts, already padded by 18 pt."""
+    rects = []
+    for _ in range(count):
+        x, y = rnd.uniform(0, SHEET.width - 200), rnd.uniform(0, SHEET.height - 150)
+        w, h = rnd.choice([(rnd.uniform(30, 120), rnd.uniform(30, 90)), (rnd.uniform(150, 400), rnd.uniform(80, 300))])
+        rects.append(MyRect(x, y, x + w, y + h).expand_rect())
+    return rects
+
+
+def run(sheets, group_counts, seed):
+    print(f"{'groups':>7} {'legacy ms':>10} {'legacy regions':>15} {'oversize':>9} {'capped':>7} "
+          f"{'packed ms':>10} {'packed regions':>15} {'oversize':>9}")
+    for count in group_counts:
+        rnd = random.Random(seed + count)
+        cases = [random_groups(rnd, count) for _ in range(sheets)]
+
+        start = time.perf_counter()
+        legacy = [legacy_regions([MyRect(r) for r in rects], SHEET) for rects in cases]
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        packed = [pack_regions(rects, SHEET) for rects in cases]
+        packed_time = time.perf_counter() - start
+
+        capped = sum(1 for _, finished in legacy if not finished)
+        legacy_regions_avg = sum(len(regions) for regions, _ in legacy) / sheets
+        packed_regions_avg = sum(len(regions) for regions in packed) / sheets
+        legacy_oversize = sum(1 for regions, _ in legacy for r in regions if not MyRect(r).fits_on_printer_paper())
+        packed_oversize = sum(1 for regions in packed for r in regions if not r.fits_on_printer_paper())
+
+        print(f"{count:>7} {1000 * legacy_time / sheets:>10.2f} {legacy_regions_avg:>15.1f} {legacy_oversize:>9} {capped:>7} "
+              f"{1000 * packed_time / sheets:>10.2f} {packed_regions_avg:>15.1f} {packed_oversize:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sheets", type=int, default=50, help="random sheets per group count")
+    parser.add_argument("--groups", type=int, nargs="+", default=[5, 20, 80, 200], help="annotation groups per sheet")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    run(args.sheets, args.groups, args.seed)
+
+
+if __name__ == "__main__":
+    main()
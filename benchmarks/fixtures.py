@@ -0,0 +1,129 @@
+"""Synthetic marked-up drawing sets for the benchmarks.
+
+Run from the repository root to write one:
+
+    python -m benchmarks.fixtures out.pdf [--pages 60] [--page-size arch-e]
+        [--annots 600] [--density 0.7] [--authors Alice:3,Bob:1] [--seed 1]
+
+Each page gets a title and a grid of vector lines so rendering has some
+content to chew on. Annotations are rect annotations spread over the
+``--annotated`` share of pages. ``density`` is the chance that an annotation
+lands in the cluster of the one before it rather than starting a new
+cluster, so 0 scatters markup over the sheet and 0.95 gives a few dense
+clouds. Authors are drawn with the given weights. The same arguments and
+seed always give the same document.
+"""
+import argparse
+import random
+from pathlib import Path
+
+import pymupdf
+
+# Width x height in points. The ARCH sizes are what drawing sets are plotted on.
+PAGE_SIZES = {
+    "letter": (8.5 * 72, 11 * 72),
+    "tabloid": (17 * 72, 11 * 72),
+    "arch-d": (36 * 72, 24 * 72),
+    "arch-e": (48 * 72, 36 * 72),
+}
+
+COLORS = [(1, 0, 0), (0, 0, 1), (0, 0.5, 0), (1, 0.5, 0)]
+CLUSTER_SPREAD = 150
+GRID_STEP = 144
+
+
+def parse_authors(text):
+    """``"Alice:3,Bob"`` as ``(["Alice", "Bob"], [3, 1])``."""
+    names, weights = [], []
+    for part in text.split(","):
+        name, _, weight = part.strip().partition(":")
+        if name:
+            names.append(name)
+            weights.append(float(weight) if weight else 1.0)
+    if not names:
+        raise ValueError("at least one author is needed")
+    return names, weights
+
+
+def fixture_name(pages=60, page_size="arch-d", annots=600, density=0.7, authors="Alice,Bob,Carol", annotated=0.66, seed=1):
+    """A file name that tells fixtures with different arguments apart."""
+    author_count = len(parse_authors(authors)[0])
+    return f"fixture-p{pages}-{page_size}-a{annots}-d{density:g}-u{author_count}-f{annotated:g}-s{seed}.pdf"
+
+
+def make_fixture(path, pages=60, page_size="arch-d", annots=600, density=0.7, authors="Alice,Bob,Carol", annotated=0.66, seed=1):
+    """Write a synthetic drawing set to ``path`` and return ``path``."""
+    rnd = random.Random(seed)
+    width, height = PAGE_SIZES[page_size]
+    names, weights = parse_authors(authors)
+
+    annotated_pages = sorted(rnd.sample(range(pages), max(1, round(pages * annotated)) if annots else 0))
+    per_page = {page_no: 0 for page_no in annotated_pages}
+    for i in range(annots):
+        per_page[annotated_pages[i % len(annotated_pages)]] += 1
+
+    doc = pymupdf.open()
+    for page_no in range(pages):
+        page = doc.new_page(width=width, height=height)
+        page.insert_text((72, 72), f"Sheet E{page_no:03d}", fontsize=min(40, width / 20))
+
+        shape = page.new_shape()
+        for x in range(0, int(width), GRID_STEP):
+            shape.draw_line((x, 0), (x, height))
+        for y in range(0, int(height), GRID_STEP):
+            shape.draw_line((0, y), (width, y))
+        shape.finish(color=(0.6, 0.6, 0.6), width=0.5)
+        shape.commit()
+
+        margin = min(200, width / 6, height / 6)
+        cx, cy = rnd.uniform(margin, width - margin), rnd.uniform(margin, height - margin)
+        for i in range(per_page.get(page_no, 0)):
+            if i and rnd.random() >= density:
+                cx, cy = rnd.uniform(margin, width - margin), rnd.uniform(margin, height - margin)
+
+            x = min(max(cx + rnd.uniform(-CLUSTER_SPREAD, CLUSTER_SPREAD), 0), width - 130)
+            y = min(max(cy + rnd.uniform(-CLUSTER_SPREAD, CLUSTER_SPREAD), 0), height - 90)
+            annot = page.add_rect_annot((x, y, x + rnd.uniform(20, 120), y + rnd.uniform(20, 80)))
+            annot.set_colors(stroke=rnd.choice(COLORS))
+            annot.set_info(
+                title=rnd.choices(names, weights)[0],
+                content=f"comment {page_no}-{i} RFI" if i % 5 == 0 else f"clash {i}",
+                subject="Cloud",
+                modDate=f"D:2025{rnd.randint(1, 12):02d}{rnd.randint(1, 28):02d}120000-08'00'",
+            )
+            annot.update()
+
+    doc.save(str(path), garbage=3, deflate=True)
+    doc.close()
+    return path
+
+
+def cached_fixture(directory, **options):
+    """The fixture for ``options`` in ``directory``, building it the first time it is asked for."""
+    path = Path(directory) / fixture_name(**options)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        make_fixture(path, **options)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output", help="PDF to write")
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--page-size", choices=sorted(PAGE_SIZES), default="arch-d")
+    parser.add_argument("--annots", type=int, default=600, help="total annotations in the set")
+    parser.add_argument("--density", type=float, default=0.7,
+                        help="0-1, chance an annotation joins the previous one's cluster (default 0.7)")
+    parser.add_argument("--authors", default="Alice,Bob,Carol", help='names with optional weights, e.g. "Alice:3,Bob:1"')
+    parser.add_argument("--annotated", type=float, default=0.66, help="share of pages carrying markup (default 0.66)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    make_fixture(args.output, pages=args.pages, page_size=args.page_size, annots=args.annots, density=args.density,
+                 authors=args.authors, annotated=args.annotated, seed=args.seed)
+    print(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Time how long the wizard takes to show its first page, and keep the results per commit.
+
+Run from the repository root:
+
+    python -m benchmarks.startup [--repeat 5] [--exe dist/PDF_Summary_Wizard/PDF_Summary_Wizard.exe]
+
+The wizard is launched ``--repeat`` times, from source or as the packaged
+executable given with ``--exe``. ``PDF_SUMMARY_STARTUP_REPORT`` makes it
+write its timings and quit as soon as the engine has loaded, and
+``PDF_SUMMARY_LAUNCHED_AT`` tells it when it was launched so a frozen build's
+unpacking is counted too. Stages, in seconds from launch:
+
+    first_page      the first wizard page is drawn
+    engine          summary_wizard (and pymupdf) is imported
+    exit            the process has exited, as seen from here
+    engine_import   a fresh interpreter importing summary_wizard (source runs only)
+
+The GUI stages need a display; without one only ``engine_import`` is
+timed. Results go to ``benchmarks/results`` like those of ``benchmarks.suite``,
+as the case ``startup``, so ``python -m benchmarks.suite --compare`` works on
+them too.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .suite import git_commit, save_report
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+SCRIPT = REPO_DIR / "PDF_Summary_Wizard.py"
+
+# Longest a launch may take before it counts as hung
+TIMEOUT = 120
+
+
+def launch_once(command, work_dir):
+    """``{stage: seconds}`` for one launch of ``command``, or None if it didn't report."""
+    report_path = Path(work_dir) / "startup.json"
+    if report_path.exists():
+        report_path.unlink()
+
+    env = dict(os.environ, PDF_SUMMARY_STARTUP_REPORT=str(report_path))
+    launched_at = time.time()
+    env["PDF_SUMMARY_LAUNCHED_AT"] = repr(launched_at)
+    start = time.perf_counter()
+    result = subprocess.run(command, env=env, cwd=REPO_DIR, capture_output=True, text=True, timeout=TIMEOUT)
+    exit_time = time.perf_counter() - start
+
+    if result.returncode != 0 or not report_path.exists():
+        message = (result.stderr.strip().splitlines() or [f"exit code {result.returncode}"])[-1]
+        print(f"  launch failed: {message}", file=sys.stderr)
+        return None
+    with open(report_path, encoding="utf-8") as f:
+        timings = json.load(f)
+    return {"first_page": timings["first_page"], "engine": timings["engine"], "exit": exit_time}
+
+
+def time_engine_import():
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import summary_wizard"], cwd=REPO_DIR, check=True)
+    return time.perf_counter() - start
+
+
+def run_startup(command, repeat, time_import):
+    results = dict()
+
+    def record(stage, timings):
+        results[stage] = {"min": min(timings), "median": statistics.median(timings), "repeat": len(timings)}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        launches = []
+        for _ in range(repeat):
+            timings = launch_once(command, work_dir)
+            if timings is None:
+                break
+            launches.append(timings)
+    for stage in ("first_page", "engine", "exit"):
+        if launches:
+            record(stage, [timings[stage] for timings in launches])
+
+    if time_import:
+        record("engine_import", [time_engine_import() for _ in range(repeat)])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--exe", help="packaged executable to launch instead of the script")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-save", action="store_true", help="print the results without writing a result file")
+    args = parser.parse_args()
+
+    command = [args.exe] if args.exe else [sys.executable, str(SCRIPT)]
+    results = run_startup(command, max(1, args.repeat), time_import=not args.exe)
+
+    print("startup")
+    for stage, result in results.items():
+        print(f"  {stage:<14} {result['min'] * 1000:>10.1f} ms  median {result['median'] * 1000:.1f} ms")
+
+    if args.no_save:
+        return
+    commit, dirty = git_commit()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.datetime.now().astimezone().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+        "repeat": args.repeat,
+        "cases": {"startup": {"fixture": {"command": "exe" if args.exe else "script"}, "stages": results}},
+    }
+    print(save_report(report))
+
+
+if __name__ == "__main__":
+    main()
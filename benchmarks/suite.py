@@ -0,0 +1,262 @@
+"""Time each pipeline stage on synthetic drawing sets and keep the results per commit.
+
+Run from the repository root:
+
+    python -m benchmarks.suite [--case small dense ...] [--repeat 3] [--quick]
+    python -m benchmarks.suite --compare benchmarks/results/OLD.json [NEW.json]
+
+Every case is a fixture from ``benchmarks.fixtures``, built once and kept in
+``--fixture-dir``. Each stage is timed separately on it, ``--repeat`` times,
+and the minimum and median wall time are reported:
+
+    scan          find_all_annots_in_pdf without a cache
+    scan_cached   find_all_annots_in_pdf answered from a warm AnnotationCache
+    filter        building an AnnotationIndex and querying one author
+    search        a full-text search of the comments on that AnnotationIndex
+    group         group_nearby_rects on every annotated page
+    pack          pack_regions on the grouped boundary rects
+    legacy_merge  merge_overlapping_rects on the same boundary rects
+    regions       generate_regions, i.e. grouping and packing from the scan records
+    write         write_summary at 72 dpi in one process
+    write_packed  the same with the compact density, several regions per page
+
+Results are written as JSON to ``benchmarks/results/<date>-<commit>.json``
+together with the commit and library versions. They describe the machine
+they were measured on, so they are kept out of git; see
+``benchmarks/results/README.md``. ``--compare`` prints the ratio of each
+stage between two such files (the newest result file when the second one is
+left out); above 1 means the newer run is slower.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pymupdf
+
+from summary_wizard import (
+    AnnotationCache,
+    AnnotationIndex,
+    FilterCriteria,
+    MyRect,
+    find_all_annots_in_pdf,
+    generate_regions,
+    group_nearby_rects,
+    merge_overlapping_rects,
+    pack_regions,
+    write_summary,
+)
+
+from .fixtures import cached_fixture
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+CASES = {
+    "small": dict(pages=20, annots=150),
+    "default": dict(pages=60, annots=600),
+    "dense": dict(pages=60, annots=2400, density=0.95),
+    "sparse": dict(pages=200, page_size="arch-e", annots=400, density=0.2, annotated=0.25),
+    "many-authors": dict(pages=60, annots=600, authors="Alice:5,Bob:3,Carol:2,Dan,Erin,Frank,Grace,Heidi"),
+}
+QUICK_CASES = ["small"]
+
+
+def git_commit():
+    """``(short hash, dirty)`` of the working tree, or ``("unknown", False)`` outside git."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        # Untracked files count too: a new module being benchmarked is not part of the commit yet
+        status = subprocess.run(["git", "status", "--porcelain"], capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, bool(status.strip())
+
+
+def timed(function, repeat):
+    """Run ``function()`` ``repeat`` times and return ``(timings, last_result)``."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def page_boundary_rects(records):
+    """``{page_no: [annotation rects]}`` from scan records."""
+    pages = dict()
+    for record in records:
+        pages.setdefault(record["page_no"], []).append(MyRect(record["bbox"]))
+    return pages
+
+
+def boundary_rects_for(rects, groups):
+    boundary_rects = []
+    for group in groups:
+        surrounding_rect = MyRect(rects[group[0]])
+        for i in group[1:]:
+            surrounding_rect = surrounding_rect.include_rect(rects[i])
+        boundary_rects.append(surrounding_rect.expand_rect())
+    return boundary_rects
+
+
+def run_case(fixture_path, repeat, work_dir):
+    """``{stage: {"min", "median", ...counters}}`` for one fixture."""
+    results = dict()
+
+    def record(stage, timings, **counters):
+        results[stage] = {"min": min(timings), "median": statistics.median(timings), "repeat": len(timings), **counters}
+
+    def scan():
+        doc = pymupdf.open(fixture_path)
+        try:
+            return find_all_annots_in_pdf(doc)[0]
+        finally:
+            doc.close()
+
+    timings, records = timed(scan, repeat)
+    record("scan", timings, annotations=len(records), pages=len({r["page_no"] for r in records}))
+
+    cache = AnnotationCache(Path(work_dir) / "cache.sqlite")
+    try:
+        doc = pymupdf.open(fixture_path)
+        find_all_annots_in_pdf(doc, cache=cache)
+        timings, _ = timed(lambda: find_all_annots_in_pdf(doc, cache=cache), repeat)
+        doc.close()
+    finally:
+        cache.close()
+    record("scan_cached", timings)
+
+    author = records[0]["author"] if records else None
+
+    def filter_records():
+        index = AnnotationIndex(records)
+        return index.query(FilterCriteria(authors=[author]))
+
+    timings, matched = timed(filter_records, repeat)
+    record("filter", timings, matched=len(matched))
+
+    index = AnnotationIndex(records)
+    timings, found = timed(lambda: index.query(FilterCriteria(text="RFI")), repeat)
+    record("search", timings, matched=len(found))
+
+    pages = page_boundary_rects(records)
+    timings, groups = timed(lambda: {page_no: group_nearby_rects(rects) for page_no, rects in pages.items()}, repeat)
+    record("group", timings, groups=sum(len(page_groups) for page_groups in groups.values()))
+
+    boundaries = {page_no: boundary_rects_for(pages[page_no], page_groups) for page_no, page_groups in groups.items()}
+    doc = pymupdf.open(fixture_path)
+    page_rects = {page_no: doc[page_no].rect for page_no in boundaries}
+    timings, packed = timed(lambda: {page_no: pack_regions(rects, page_rects[page_no]) for page_no, rects in boundaries.items()}, repeat)
+    record("pack", timings, regions=sum(len(regions) for regions in packed.values()))
+
+    # merge_overlapping_rects pops from the list it is given and grows its rects in place
+    timings, merged = timed(lambda: {page_no: merge_overlapping_rects([MyRect(r) for r in rects]) for page_no, rects in boundaries.items()}, repeat)
+    record("legacy_merge", timings, regions=sum(len(regions) for regions in merged.values()))
+
+    timings, shots = timed(lambda: generate_regions(doc, records, page_rects), repeat)
+    record("regions", timings, regions=sum(len(screenshot_dict) for _, _, screenshot_dict in shots))
+
+    output_path = Path(work_dir) / "summary.pdf"
+    timings, _ = timed(lambda: write_summary(doc, shots, output_path), repeat)
+    record("write", timings, bytes=output_path.stat().st_size)
+
+    timings, _ = timed(lambda: write_summary(doc, shots, output_path, density="compact"), repeat)
+    record("write_packed", timings, bytes=output_path.stat().st_size)
+    doc.close()
+
+    return results
+
+
+def run_suite(case_names, repeat, fixture_dir):
+    commit, dirty = git_commit()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.datetime.now().astimezone().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pymupdf": pymupdf.VersionBind,
+        "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+        "repeat": repeat,
+        "cases": dict(),
+    }
+
+    for name in case_names:
+        fixture_path = cached_fixture(fixture_dir, **CASES[name])
+        with tempfile.TemporaryDirectory() as work_dir:
+            results = run_case(fixture_path, repeat, work_dir)
+        report["cases"][name] = {"fixture": CASES[name], "stages": results}
+
+        print(f"{name}")
+        for stage, result in results.items():
+            counters = ", ".join(f"{key} {value}" for key, value in result.items() if key not in ("min", "median", "repeat"))
+            print(f"  {stage:<14} {result['min'] * 1000:>10.1f} ms  {counters}")
+    return report
+
+
+def save_report(report):
+    RESULTS_DIR.mkdir(exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = RESULTS_DIR / f"{stamp}-{report['commit']}{'-dirty' if report['dirty'] else ''}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def compare(old_path, new_path):
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+
+    print(f"{old['commit']} -> {new['commit']} (min times)")
+    for name, case in new["cases"].items():
+        if name not in old["cases"]:
+            continue
+        print(name)
+        for stage, result in case["stages"].items():
+            before = old["cases"][name]["stages"].get(stage)
+            if before is None:
+                continue
+            ratio = result["min"] / before["min"] if before["min"] else float("inf")
+            print(f"  {stage:<14} {before['min'] * 1000:>10.1f} -> {result['min'] * 1000:>10.1f} ms  x{ratio:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--case", nargs="+", choices=sorted(CASES), help="cases to run (default: all)")
+    parser.add_argument("--quick", action="store_true", help=f"only run {', '.join(QUICK_CASES)}")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--fixture-dir", default=str(Path(tempfile.gettempdir()) / "summary_wizard_fixtures"),
+                        help="where generated fixtures are kept between runs")
+    parser.add_argument("--no-save", action="store_true", help="print the results without writing a result file")
+    parser.add_argument("--compare", nargs="+", metavar="RESULT", help="compare two result files instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        if len(args.compare) == 2:
+            old_path, new_path = args.compare
+        else:
+            newest = sorted(RESULTS_DIR.glob("*.json"))
+            if not newest:
+                sys.exit("No result files to compare against")
+            old_path, new_path = args.compare[0], newest[-1]
+        compare(old_path, new_path)
+        return
+
+    case_names = args.case or (QUICK_CASES if args.quick else list(CASES))
+    report = run_suite(case_names, max(1, args.repeat), args.fixture_dir)
+    if not args.no_save:
+        print(save_report(report))
+
+
+if __name__ == "__main__":
+    main()
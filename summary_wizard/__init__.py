@@ -0,0 +1,58 @@
+"""Annotation summary engine behind the PDF Summary Wizard.
+
+Everything here runs without a display so summaries can be produced from the
+tkinter wizard, from ``python -m summary_wizard`` or from other scripts.
+"""
+from . import trace
+from .batch import MANIFEST_NAME, batch_counts, collect_inputs, load_manifest, run_batch, summarize_file
+from .cache import AnnotationCache, default_cache_dir, file_fingerprint
+from .clustering import DisjointSet, group_nearby_rects, pack_regions
+from .engine import (
+    NoMatchingAnnotations,
+    default_output_path,
+    filter_annots,
+    generate_regions,
+    iter_regions,
+    open_document,
+    parse_page_filter,
+    summarize,
+    write_incremental_summary,
+)
+from .export import EXPORT_FORMATS, default_export_path, export_annotations, export_format_for, export_records
+from .filtering import (
+    AnnotationIndex,
+    FilterCriteria,
+    color_hex,
+    parse_date_filter,
+    parse_label_filter,
+    parse_search_filter,
+)
+from .geometry import MAX_PAPER_SIDE, MIN_PAPER_SIDE, MyRect, merge_overlapping_rects
+from .incremental import PreviousSummary, page_fingerprint, sidecar_path
+from .layout import DEFAULT_DENSITY, DENSITIES, SummaryPage, Tile, layout_pages
+from .memory import format_bytes, peak_memory_bytes
+from .render import (
+    IMAGE_FORMATS,
+    RENDER_MODES,
+    ClipRenderer,
+    DisplayListCache,
+    baked_copy,
+    default_workers,
+    iter_rendered_clips,
+    render_clip,
+)
+from .scan import (
+    PageRects,
+    SummaryCancelled,
+    annots_fingerprint,
+    find_all_annots_in_pdf,
+    iter_annotated_pages,
+    iter_annotations,
+    page_has_annots,
+    parse_pdf_date,
+    scan_page,
+)
+from .search import NEARBY_MARGIN, SearchIndex, nearby_page_text, parse_query, text_matches
+from .store import AnnotationStore, as_store
+from .thumbnails import THUMBNAIL_BOX, ThumbnailCache, ThumbnailRenderer, render_thumbnail
+from .writer import CHUNK_PAGES, ReusedPages, SummaryWriter, write_pages, write_summary
@@ -0,0 +1,278 @@
+"""Summarizing a whole folder of drawing sets, several documents at a time.
+
+Each document is summarized in its own worker process with ``summarize``; a
+failure is recorded against that file and the batch carries on. Progress is
+kept in a JSON manifest that is rewritten after every file, holding each
+file's status, output, error, timings and the options it was summarized
+with. Running the same batch again with that manifest skips the files
+already summarized (as long as they haven't changed since, their summary is
+still there and the options are the same), so an interrupted batch picks up
+where it stopped.
+"""
+import datetime
+import glob
+import json
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from .cache import AnnotationCache
+from .engine import NoMatchingAnnotations, default_output_path, summarize
+from .incremental import LAYOUT_DEFAULTS
+from .scan import SummaryCancelled, _check_cancelled, _report
+
+MANIFEST_VERSION = 1
+MANIFEST_NAME = "summary_batch.json"
+
+# Statuses that a resumed batch doesn't run again
+FINISHED_STATUSES = ("done", "empty")
+
+# summarize options that change what a summary holds, with summarize's defaults
+SUMMARY_OPTION_DEFAULTS = {"authors": None, "pages": "all", "search": None, "search_nearby": False, "incremental": False,
+                           **LAYOUT_DEFAULTS}
+
+
+def is_batch_input(text):
+    """Whether a command line input names a folder or a glob pattern rather than one PDF."""
+    # A sheet set named "A-101 [Rev C].pdf" is one file, not a pattern
+    if os.path.isfile(text):
+        return False
+    return os.path.isdir(text) or any(char in text for char in "*?[")
+
+
+def collect_inputs(pattern):
+    """The PDFs in folder ``pattern``, or matching glob ``pattern``, sorted; summaries themselves are left out."""
+    if os.path.isdir(pattern):
+        paths = [path for path in Path(pattern).iterdir() if path.suffix.lower() == ".pdf"]
+    else:
+        paths = [Path(path) for path in glob.glob(pattern, recursive=True)]
+
+    return sorted(str(path.resolve()) for path in paths
+                  if path.is_file() and not path.stem.endswith("_summary"))
+
+
+def batch_output_path(file_path, output_dir=None):
+    if output_dir is None:
+        return default_output_path(file_path)
+    return str(Path(output_dir) / Path(default_output_path(file_path)).name)
+
+
+def _file_stamp(file_path):
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def load_manifest(manifest_path):
+    """The manifest at ``manifest_path``, or a new empty one when there is none (or it is unreadable)."""
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {"version": MANIFEST_VERSION, "files": {}}
+    if manifest.get("version") != MANIFEST_VERSION or not isinstance(manifest.get("files"), dict):
+        return {"version": MANIFEST_VERSION, "files": {}}
+    return manifest
+
+
+def save_manifest(manifest, manifest_path):
+    # Written to the side and renamed so an interrupted batch never leaves half a manifest
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, manifest_path)
+
+
+def summary_options(options):
+    """The ``SUMMARY_OPTION_DEFAULTS`` part of ``summarize`` ``options`` as they are kept in the manifest."""
+    options = options or {}
+    recorded = {name: options.get(name, default) for name, default in SUMMARY_OPTION_DEFAULTS.items()}
+    # Sets become sorted lists so the entry is JSON and compares the same after a round trip
+    recorded["authors"] = sorted(recorded["authors"]) if recorded["authors"] else None
+    if recorded["pages"] != "all":
+        recorded["pages"] = sorted(recorded["pages"])
+    return recorded
+
+
+def is_up_to_date(entry, file_path, options=None):
+    """Whether the manifest ``entry`` says ``file_path`` was already summarized, as it is now and with ``options``."""
+    if entry is None or entry.get("status") not in FINISHED_STATUSES:
+        return False
+    if entry.get("options") != summary_options(options):
+        return False
+    try:
+        if tuple(entry.get("stamp") or ()) != _file_stamp(file_path):
+            return False
+    except OSError:
+        return False
+    return entry["status"] == "empty" or os.path.exists(entry.get("output") or "")
+
+
+def summarize_file(file_path, output_path, cache_db=None, use_cache=True, options=None, cancel=None):
+    """Summarize one document and return its manifest entry instead of raising.
+
+    Normally runs in a worker process, so everything it takes and returns is
+    plain data; ``cancel`` only works when it is called in-process.
+    ``stages`` holds the seconds spent in each pipeline stage.
+    """
+    started = time.perf_counter()
+    stage_starts = dict()
+
+    def progress(stage, done, total):
+        stage_starts.setdefault(stage, time.perf_counter())
+
+    entry = {
+        "status": "done",
+        "output": output_path,
+        "error": None,
+        "stamp": None,
+        "options": summary_options(options),
+        "started": datetime.datetime.now().astimezone().isoformat(timespec="seconds"),
+    }
+
+    cache = None
+    try:
+        entry["stamp"] = list(_file_stamp(file_path))
+        if use_cache:
+            try:
+                cache = AnnotationCache(cache_db)
+            except (OSError, sqlite3.Error):
+                cache = None
+        summarize(file_path, output_path, progress=progress, cancel=cancel, cache=cache, **(options or {}))
+    except SummaryCancelled:
+        raise
+    except NoMatchingAnnotations as e:
+        entry.update(status="empty", output=None, error=str(e))
+    except Exception as e:
+        entry.update(status="failed", output=None, error=f"{type(e).__name__}: {e}")
+    finally:
+        if cache is not None:
+            cache.close()
+
+    finished = time.perf_counter()
+    entry["seconds"] = round(finished - started, 3)
+    ordered = sorted(stage_starts.items(), key=lambda item: item[1])
+    entry["stages"] = {
+        stage: round((ordered[i + 1][1] if i + 1 < len(ordered) else finished) - stage_start, 3)
+        for i, (stage, stage_start) in enumerate(ordered)
+    }
+    return entry
+
+
+def run_batch(inputs, manifest_path, output_dir=None, jobs=1, resume=True, progress=None, cancel=None, on_file=None,
+              cache_db=None, use_cache=True, **options):
+    """Summarize every PDF in ``inputs`` and return the manifest.
+
+    ``jobs`` documents are summarized at once, each in its own process. With
+    ``resume`` the files the manifest at ``manifest_path`` already lists as
+    finished are skipped. ``on_file(file_path, entry)`` is called as each
+    file finishes, and ``progress("batch", done, total)`` counts them.
+    ``options`` (``authors``, ``pages``, ``mode``, ``dpi`` ...) go to
+    ``summarize`` for every file; a finished file summarized with different
+    ones is done again. A worker process that dies (out of memory, killed)
+    fails only the file it was summarizing. Once ``cancel`` is set no new file is
+    started; those already running are finished and recorded, then
+    ``SummaryCancelled`` is raised.
+    """
+    manifest = load_manifest(manifest_path) if resume else {"version": MANIFEST_VERSION, "files": {}}
+    files = manifest["files"]
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    pending = [file_path for file_path in inputs if not (resume and is_up_to_date(files.get(file_path), file_path, options))]
+    total = len(pending)
+    done = 0
+
+    def record(file_path, entry):
+        nonlocal done
+        files[file_path] = entry
+        save_manifest(manifest, manifest_path)
+        done += 1
+        if on_file is not None:
+            on_file(file_path, entry)
+        _report(progress, "batch", done, total)
+
+    _report(progress, "batch", 0, total)
+    arguments = {file_path: (file_path, batch_output_path(file_path, output_dir), cache_db, use_cache, options)
+                 for file_path in pending}
+
+    if jobs <= 1 or total < 2:
+        for file_path in pending:
+            _check_cancelled(cancel)
+            record(file_path, summarize_file(*arguments[file_path], cancel=cancel))
+        return manifest
+
+    queued = deque(pending)
+    # Files that were running when a worker process died. Only the one that died can be blamed, so
+    # each of them is run again on its own: one that breaks the pool while running alone is the culprit.
+    suspects = set()
+    running = dict()
+    executor = None
+    try:
+        while True:
+            if executor is None:
+                executor = ProcessPoolExecutor(max_workers=min(jobs, total))
+            broken = False
+            # Keep exactly ``jobs`` files in flight so cancelling never strands queued work
+            while len(running) < jobs and queued and not (cancel is not None and cancel.is_set()):
+                if running and (queued[0] in suspects or not suspects.isdisjoint(running.values())):
+                    break
+                file_path = queued.popleft()
+                try:
+                    running[executor.submit(summarize_file, *arguments[file_path])] = file_path
+                except BrokenProcessPool:
+                    queued.appendleft(file_path)
+                    broken = True
+                    break
+            if not running and not broken:
+                break
+
+            if broken:
+                # Every future still running fails with the pool
+                finished, _ = wait(running)
+            else:
+                finished, _ = wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
+            lost = []
+            for future in finished:
+                file_path = running.pop(future)
+                try:
+                    entry = future.result()
+                except BrokenProcessPool:
+                    lost.append(file_path)
+                    continue
+                except Exception as e:
+                    entry = {"status": "failed", "output": None, "error": f"{type(e).__name__}: {e}", "stamp": None}
+                suspects.discard(file_path)
+                record(file_path, entry)
+
+            if lost or broken:
+                # The rest of the batch goes on in a new pool
+                lost.extend(running.pop(future) for future in list(running))
+                if len(lost) == 1:
+                    suspects.discard(lost[0])
+                    record(lost[0], {"status": "failed", "output": None, "stamp": None,
+                                     "error": "The worker process summarizing this file died (out of memory or killed)"})
+                else:
+                    suspects.update(lost)
+                    queued.extendleft(reversed(lost))
+                executor.shutdown(wait=True, cancel_futures=True)
+                executor = None
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    if done < total:
+        _check_cancelled(cancel)
+    return manifest
+
+
+def batch_counts(manifest, inputs=None):
+    """``{status: count}`` over ``inputs`` (default: every file in the manifest)."""
+    counts = dict()
+    for file_path in inputs if inputs is not None else manifest["files"]:
+        status = manifest["files"].get(file_path, {}).get("status", "pending")
+        counts[status] = counts.get(status, 0) + 1
+    return counts
@@ -0,0 +1,188 @@
+"""On-disk cache of annotation records, so re-opening a drawing set skips the scan.
+
+Records live in one SQLite database in the user's cache directory. A file is
+identified by its resolved path and fingerprinted by size, modification time
+and a hash of its first and last megabyte; hashing the whole of a 2 GB plan
+set would cost more than the scan it saves. When the fingerprint matches the
+stored records are returned as they are. When it does not, each page's
+annotation fingerprint and sheet key (see ``scan.annots_fingerprint`` and
+``scan.sheet_key``, which covers the page label and CropBox) decide whether
+that page is re-scanned or copied from the cache. Only annotated pages are stored;
+the rest are skipped by the scan anyway.
+"""
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+from pymupdf import Rect
+
+from . import trace
+from .store import AnnotationStore
+
+SCHEMA_VERSION = 4
+SAMPLE_BYTES = 1 << 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sample_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    path TEXT NOT NULL,
+    page_no INTEGER NOT NULL,
+    annots_key TEXT NOT NULL,
+    page_label TEXT NOT NULL,
+    x0 REAL, y0 REAL, x1 REAL, y1 REAL,
+    PRIMARY KEY (path, page_no)
+);
+CREATE TABLE IF NOT EXISTS annots (
+    path TEXT NOT NULL,
+    page_no INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    id TEXT,
+    author TEXT,
+    stroke_color TEXT,
+    last_modified TEXT,
+    content TEXT,
+    subject TEXT,
+    x0 REAL, y0 REAL, x1 REAL, y1 REAL,
+    PRIMARY KEY (path, page_no, seq)
+);
+"""
+
+
+def default_cache_dir():
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local"
+        return Path(base) / "PDF_Summary_Wizard" / "cache"
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "pdf_summary_wizard"
+
+
+def file_fingerprint(file_path):
+    """``(size, mtime_ns, sample_hash)`` for ``file_path``."""
+    stat = os.stat(file_path)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        digest.update(f.read(SAMPLE_BYTES))
+        if stat.st_size > SAMPLE_BYTES:
+            f.seek(max(SAMPLE_BYTES, stat.st_size - SAMPLE_BYTES))
+            digest.update(f.read(SAMPLE_BYTES))
+    return stat.st_size, stat.st_mtime_ns, digest.hexdigest()
+
+
+class FileKey:
+    def __init__(self, path, fingerprint):
+        self.path = path
+        self.fingerprint = fingerprint
+
+
+class AnnotationCache:
+    """SQLite store of the records ``find_all_annots_in_pdf`` produces.
+
+    Like any ``sqlite3`` connection an instance belongs to the thread that
+    created it, so create it on the thread that runs the scan.
+    """
+
+    def __init__(self, db_path=None):
+        if db_path is None:
+            cache_dir = default_cache_dir()
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            db_path = cache_dir / f"annotations-v{SCHEMA_VERSION}.sqlite"
+
+        self.db_path = str(db_path)
+        self.connection = sqlite3.connect(self.db_path, timeout=30)
+        self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def file_key(self, file_path):
+        return FileKey(str(Path(file_path).resolve()), file_fingerprint(file_path))
+
+    def load_document(self, file_key):
+        """Return ``(doc_annots, page_rects)`` if the cached copy of the file is current, else None."""
+        with trace.span("cache.load"):
+            return self._load_document(file_key)
+
+    def _load_document(self, file_key):
+        row = self.connection.execute(
+            "SELECT size, mtime_ns, sample_hash FROM files WHERE path = ?", (file_key.path,)
+        ).fetchone()
+        if row is None or tuple(row) != tuple(file_key.fingerprint):
+            return None
+
+        page_rects = dict()
+        page_labels = dict()
+        for page_no, page_label, x0, y0, x1, y1 in self.connection.execute(
+            "SELECT page_no, page_label, x0, y0, x1, y1 FROM pages WHERE path = ?", (file_key.path,)
+        ):
+            page_rects[page_no] = Rect(x0, y0, x1, y1)
+            page_labels[page_no] = page_label
+
+        # Straight into the store, without building a dict per record on the way
+        doc_annots = AnnotationStore()
+        for page_no, annot_id, author, stroke_color, last_modified, content, subject, x0, y0, x1, y1 in self.connection.execute(
+            "SELECT page_no, id, author, stroke_color, last_modified, content, subject, x0, y0, x1, y1 FROM annots "
+            "WHERE path = ? ORDER BY page_no, seq", (file_key.path,)
+        ):
+            if page_no not in page_labels:
+                continue
+            doc_annots.append_values(page_no, page_labels[page_no], annot_id, author, json.loads(stroke_color),
+                                     datetime.datetime.fromisoformat(last_modified) if last_modified else None,
+                                     content, (x0, y0, x1, y1), subject)
+        return doc_annots, page_rects
+
+    def load_pages(self, file_key):
+        """``{page_no: (annots_key, page_label, page_rect, records)}`` for the annotated pages of the last scan."""
+        pages = dict()
+        for page_no, annots_key, page_label, x0, y0, x1, y1 in self.connection.execute(
+            "SELECT page_no, annots_key, page_label, x0, y0, x1, y1 FROM pages WHERE path = ?", (file_key.path,)
+        ):
+            pages[page_no] = (annots_key, page_label, Rect(x0, y0, x1, y1), [])
+
+        for page_no, annot_id, author, stroke_color, last_modified, content, subject, x0, y0, x1, y1 in self.connection.execute(
+            "SELECT page_no, id, author, stroke_color, last_modified, content, subject, x0, y0, x1, y1 FROM annots "
+            "WHERE path = ? ORDER BY page_no, seq", (file_key.path,)
+        ):
+            if page_no not in pages:
+                continue
+            pages[page_no][3].append({
+                "page_no": page_no,
+                "page_label": pages[page_no][1],
+                "id": annot_id,
+                "author": author,
+                "stroke_color": json.loads(stroke_color),
+                "last_modified": datetime.datetime.fromisoformat(last_modified) if last_modified else None,
+                "content": content,
+                "subject": subject,
+                "bbox": (x0, y0, x1, y1),
+            })
+        return pages
+
+    def store(self, file_key, pages):
+        """Replace everything cached for this path with ``pages`` (as returned by ``load_pages``)."""
+        with trace.span("cache.store", pages=len(pages)), self.connection:
+            self.connection.execute("DELETE FROM files WHERE path = ?", (file_key.path,))
+            self.connection.execute("DELETE FROM pages WHERE path = ?", (file_key.path,))
+            self.connection.execute("DELETE FROM annots WHERE path = ?", (file_key.path,))
+
+            self.connection.executemany(
+                "INSERT INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                ((file_key.path, page_no, annots_key, page_label, *tuple(page_rect))
+                 for page_no, (annots_key, page_label, page_rect, _) in pages.items()),
+            )
+            self.connection.executemany(
+                "INSERT INTO annots VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((file_key.path, page_no, seq, record["id"], record["author"], json.dumps(record["stroke_color"]),
+                  record["last_modified"].isoformat() if record["last_modified"] is not None else None,
+                  record["content"], record.get("subject"), *record["bbox"])
+                 for page_no, (_, _, _, records) in pages.items() for seq, record in enumerate(records)),
+            )
+            self.connection.execute("INSERT INTO files VALUES (?, ?, ?, ?)", (file_key.path, *file_key.fingerprint))
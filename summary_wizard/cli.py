@@ -0,0 +1,185 @@
+"""Command line entry point: ``python -m summary_wizard drawings.pdf --author Alice``.
+
+Given a folder or a glob (``python -m summary_wizard "sets/*.pdf" -j 4``) it
+summarizes every PDF in it as a resumable batch; see ``batch``.
+"""
+import argparse
+import sqlite3
+import sys
+from pathlib import Path
+
+from .batch import MANIFEST_NAME, batch_counts, collect_inputs, is_batch_input, run_batch
+from . import trace
+from .cache import AnnotationCache
+from .engine import default_output_path, parse_page_filter, summarize
+from .export import EXPORT_FORMATS, default_export_path, export_annotations
+from .memory import format_bytes, peak_memory_bytes
+from .layout import DEFAULT_DENSITY, DENSITIES
+from .render import IMAGE_FORMATS, RENDER_MODES, default_workers
+from .writer import CHUNK_PAGES
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m summary_wizard",
+        description="Build a summary PDF with a screenshot of every annotated region in a drawing set.",
+    )
+    parser.add_argument("input", help="marked-up PDF to summarize, or a folder or quoted glob of them for a batch")
+    parser.add_argument("-o", "--output", help="summary PDF to write (default: <input>_summary.pdf)")
+    parser.add_argument("--export", choices=EXPORT_FORMATS, metavar="FORMAT",
+                        help="write the comment log as csv, jsonl or xlsx (default <input>_annotations.<format>) "
+                             "instead of a summary PDF; nothing is rendered")
+    parser.add_argument("--output-dir", help="batch: folder for the summaries (default: next to each input)")
+    parser.add_argument("--manifest", help=f"batch: JSON file recording each file's status (default: {MANIFEST_NAME} "
+                                           "in the output folder, or in the input folder)")
+    parser.add_argument("--restart", action="store_true", help="batch: redo every file instead of resuming from the manifest")
+    parser.add_argument("-a", "--author", action="append", dest="authors", metavar="NAME",
+                        help="only include annotations by this author (repeat for several)")
+    parser.add_argument("-p", "--pages", default="", help='page numbers to include, e.g. "2-6, 9, 12-16"')
+    parser.add_argument("-s", "--search", metavar="TEXT",
+                        help='only include comments whose text or subject has these words, e.g. "RFI" or \'clash "grid C"\'')
+    parser.add_argument("--search-nearby", action="store_true",
+                        help="with --search, also search the page text around each annotation (slower)")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="processes used to render screenshots, or documents summarized at once in a batch "
+                             "(0 for one per CPU, default 1)")
+    parser.add_argument("--mode", choices=RENDER_MODES, default="raster",
+                        help="raster: screenshots as images; vector: regions embedded as PDF content (default raster)")
+    parser.add_argument("--dpi", type=int, default=72, help="resolution of raster screenshots (default 72)")
+    parser.add_argument("--image-format", choices=IMAGE_FORMATS, default="png",
+                        help="png (lossless, deflate) or jpeg for raster screenshots (default png)")
+    parser.add_argument("--jpeg-quality", type=int, default=85, help="JPEG quality 1-100 (default 85)")
+    parser.add_argument("--density", choices=DENSITIES, default=DEFAULT_DENSITY,
+                        help="single: one region per page; normal: regions packed several to a page; "
+                             f"compact: packed at 60%% size (default {DEFAULT_DENSITY})")
+    parser.add_argument("--chunk-pages", type=int, default=CHUNK_PAGES,
+                        help=f"summary pages held in memory before they are flushed to disk (default {CHUNK_PAGES})")
+    parser.add_argument("--incremental", action="store_true",
+                        help="update an existing summary, re-rendering only the pages whose annotations changed "
+                             "(keeps <output>.regions.json next to it)")
+    parser.add_argument("--no-cache", action="store_true", help="always re-scan instead of using the annotation cache")
+    parser.add_argument("--cache-db", help="annotation cache database to use (default: one in the user cache directory)")
+    parser.add_argument("--trace", metavar="PATH",
+                        help=f"record stage timings and counters to PATH (also enabled by ${trace.TRACE_ENV})")
+    parser.add_argument("--trace-format", choices=trace.TRACE_FORMATS, default="chrome",
+                        help="chrome: trace events for chrome://tracing or Perfetto; summary: totals per stage (default chrome)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not print progress")
+    return parser
+
+
+def print_progress(stage, done, total):
+    if total:
+        print(f"\r{stage:>8}: {done}/{total}", end="\n" if done == total else "", file=sys.stderr, flush=True)
+
+
+def print_batch_file(file_path, entry):
+    detail = entry["output"] if entry["status"] == "done" else entry["error"]
+    print(f"{entry['status']:>8}: {file_path} ({entry.get('seconds', 0):.1f} s) -> {detail}", file=sys.stderr, flush=True)
+
+
+def run_batch_command(args, pages):
+    inputs = collect_inputs(args.input)
+    if not inputs:
+        print(f"No PDFs found for {args.input!r}", file=sys.stderr)
+        return 2
+
+    manifest_dir = args.output_dir or (args.input if Path(args.input).is_dir() else ".")
+    manifest_path = args.manifest or str(Path(manifest_dir) / MANIFEST_NAME)
+    jobs = args.workers if args.workers > 0 else default_workers()
+
+    try:
+        manifest = run_batch(inputs, manifest_path, output_dir=args.output_dir, jobs=jobs, resume=not args.restart,
+                             on_file=None if args.quiet else print_batch_file,
+                             cache_db=args.cache_db, use_cache=not args.no_cache,
+                             authors=args.authors, pages=pages, search=args.search, search_nearby=args.search_nearby,
+                             mode=args.mode, dpi=args.dpi, image_format=args.image_format, jpeg_quality=args.jpeg_quality,
+                             chunk_pages=args.chunk_pages, density=args.density, incremental=args.incremental)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    counts = batch_counts(manifest, inputs)
+    print(", ".join(f"{count} {status}" for status, count in sorted(counts.items())), file=sys.stderr)
+    print(manifest_path)
+    return 1 if counts.get("failed") else 0
+
+
+def run_export_command(args, pages):
+    output_path = args.output or default_export_path(args.input, args.export)
+    try:
+        _, rows = export_annotations(args.input, output_path, args.export, authors=args.authors, pages=pages,
+                                     search=args.search, progress=None if args.quiet else print_progress)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if not args.quiet:
+        print(f"{rows} annotations, peak memory: {format_bytes(peak_memory_bytes())}", file=sys.stderr)
+    print(output_path)
+    return 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.trace:
+        trace.enable(args.trace, args.trace_format)
+    else:
+        trace.enable_from_environment()
+    try:
+        return run(args)
+    finally:
+        trace.finish()
+
+
+def run(args):
+    try:
+        pages = parse_page_filter(args.pages)
+    except ValueError:
+        print(f"Could not understand the page filter {args.pages!r}", file=sys.stderr)
+        return 2
+
+    if args.search_nearby and (args.search is None or args.export):
+        print("--search-nearby needs --search, and works on summaries only", file=sys.stderr)
+        return 2
+
+    if is_batch_input(args.input):
+        if args.output:
+            print("--output names a single summary; use --output-dir for a batch", file=sys.stderr)
+            return 2
+        if args.export:
+            print("--export works on one PDF at a time", file=sys.stderr)
+            return 2
+        return run_batch_command(args, pages)
+
+    if args.export:
+        return run_export_command(args, pages)
+
+    output_path = args.output or default_output_path(args.input)
+    workers = args.workers if args.workers > 0 else default_workers()
+
+    cache = None
+    if not args.no_cache:
+        try:
+            cache = AnnotationCache(args.cache_db)
+        except (OSError, sqlite3.Error):
+            # An unwritable or corrupt cache only costs a full scan
+            cache = None
+
+    try:
+        summarize(args.input, output_path, authors=args.authors, pages=pages,
+                  search=args.search, search_nearby=args.search_nearby,
+                  workers=workers, cache=cache, incremental=args.incremental, mode=args.mode, dpi=args.dpi,
+                  image_format=args.image_format, jpeg_quality=args.jpeg_quality, chunk_pages=args.chunk_pages,
+                  density=args.density, progress=None if args.quiet else print_progress)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if cache is not None:
+            cache.close()
+
+    if not args.quiet:
+        print(f"Peak memory: {format_bytes(peak_memory_bytes())}", file=sys.stderr)
+    print(output_path)
+    return 0
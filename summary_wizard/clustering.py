@@ -0,0 +1,181 @@
+"""Grouping annotations that sit close together on a sheet.
+
+Two annotations belong to the same group when their bounding boxes, each grown
+by ``margin`` points, overlap; groups are the connected components of that
+relation. A uniform grid limits the overlap tests to rects sharing a cell, so
+heavily marked-up sheets cost roughly linear time instead of quadratic.
+
+The groups are then packed into screenshot regions that each fit on a sheet of
+printer paper with ``pack_regions``.
+"""
+import heapq
+import math
+from collections import defaultdict
+
+from . import trace
+from .geometry import MAX_PAPER_SIDE, MyRect, fits_on_printer_paper
+
+
+class DisjointSet:
+    """Union-find over ``0..n-1``. The smaller index always becomes the root."""
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return False
+        if root_b < root_a:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        return True
+
+
+def _overlaps(a, b):
+    # Same strict test as pymupdf.Rect.intersects
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def group_nearby_rects(rects, margin=18):
+    """Return groups of indices into ``rects`` whose ``margin``-expanded boxes touch.
+
+    Groups come back ordered by their first member and each group lists its
+    members in input order, so the result does not depend on grid layout.
+    """
+    boxes = [(r[0] - margin, r[1] - margin, r[2] + margin, r[3] + margin) for r in rects]
+    if not boxes:
+        return []
+
+    # Cells about the size of a typical box keep both the number of cells a box
+    # covers and the number of boxes per cell small.
+    mean_size = sum((b[2] - b[0]) + (b[3] - b[1]) for b in boxes) / (2 * len(boxes))
+    cell = max(mean_size, 2 * margin, 1.0)
+
+    sets = DisjointSet(len(boxes))
+    grid = defaultdict(list)
+
+    for i, box in enumerate(boxes):
+        for cx in range(math.floor(box[0] / cell), math.floor(box[2] / cell) + 1):
+            for cy in range(math.floor(box[1] / cell), math.floor(box[3] / cell) + 1):
+                members = grid[(cx, cy)]
+                for j in members:
+                    if sets.find(i) != sets.find(j) and _overlaps(box, boxes[j]):
+                        sets.union(i, j)
+                members.append(i)
+
+    groups = defaultdict(list)
+    for i in range(len(boxes)):
+        groups[sets.find(i)].append(i)
+
+    return [groups[root] for root in sorted(groups)]
+
+
+def _gap(a, b):
+    dx = max(0.0, b[0] - a[2], a[0] - b[2])
+    dy = max(0.0, b[1] - a[3], a[1] - b[3])
+    return math.hypot(dx, dy)
+
+
+def _union(a, b):
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def _area(r):
+    return (r[2] - r[0]) * (r[3] - r[1])
+
+
+def pack_regions(rects, page_rect=None):
+    """Merge ``rects`` into as few screenshot regions as possible.
+
+    Agglomerative clustering driven by a priority queue: the closest pair of
+    regions (ties broken by the least wasted area) is merged as long as the
+    merged region still ``fits_on_printer_paper``. Each merge removes a region,
+    so the loop runs at most ``len(rects) - 1`` times. A grid with cells the
+    size of the paper limits candidate pairs to neighbouring regions, since
+    anything further away could never be merged anyway.
+
+    Regions are clipped to ``page_rect`` when given and returned as ``MyRect``
+    in reading order (top to bottom, then left to right).
+    """
+    alive = {i: tuple(r) for i, r in enumerate(rects)}
+    if not alive:
+        return []
+
+    cell = max(MAX_PAPER_SIDE, 1.0)
+    grid = defaultdict(set)
+
+    def cells(r):
+        for cx in range(math.floor(r[0] / cell), math.floor(r[2] / cell) + 1):
+            for cy in range(math.floor(r[1] / cell), math.floor(r[3] / cell) + 1):
+                yield cx, cy
+
+    def neighbours(r):
+        window = (r[0] - cell, r[1] - cell, r[2] + cell, r[3] + cell)
+        found = set()
+        for key in cells(window):
+            found.update(grid.get(key, ()))
+        return found
+
+    def candidate(i, j):
+        merged = _union(alive[i], alive[j])
+        if not fits_on_printer_paper(merged[2] - merged[0], merged[3] - merged[1]):
+            return None
+        waste = _area(merged) - _area(alive[i]) - _area(alive[j])
+        return (_gap(alive[i], alive[j]), waste, min(i, j), max(i, j))
+
+    heap = []
+    for i, r in alive.items():
+        for j in neighbours(r):
+            entry = candidate(i, j)
+            if entry is not None:
+                heap.append(entry)
+        for key in cells(r):
+            grid[key].add(i)
+    heapq.heapify(heap)
+
+    next_id = len(rects)
+    merges = 0
+    while heap:
+        _, _, i, j = heapq.heappop(heap)
+        if i not in alive or j not in alive:
+            # One side was already merged into something else
+            continue
+
+        merged = _union(alive[i], alive[j])
+        for old in (i, j):
+            for key in cells(alive.pop(old)):
+                grid[key].discard(old)
+
+        new = next_id
+        next_id += 1
+        merges += 1
+        alive[new] = merged
+        for other in neighbours(merged):
+            entry = candidate(new, other)
+            if entry is not None:
+                heapq.heappush(heap, entry)
+        for key in cells(merged):
+            grid[key].add(new)
+
+    trace.count("pack.merges", merges)
+
+    regions = []
+    for r in alive.values():
+        region = MyRect(r)
+        if page_rect is not None:
+            region = MyRect(region.intersect(page_rect))
+            # Markup lying outside the page's CropBox leaves nothing to show
+            if region.is_empty:
+                continue
+        regions.append(region)
+
+    regions.sort(key=lambda r: (r.y0, r.x0))
+    return regions
@@ -0,0 +1,264 @@
+"""Headless summary pipeline: scan -> filter -> cluster -> render -> write.
+
+The tkinter wizard and the command line both drive these functions. Long
+running stages accept an optional ``progress(stage, done, total)`` callback so
+the caller can move a progress bar, print to a console or ignore it entirely,
+and an optional ``cancel`` event (anything with ``is_set()``, normally a
+``threading.Event``) that stops the stage with ``SummaryCancelled``.
+"""
+import math
+import os
+from pathlib import Path
+
+import pymupdf
+from pymupdf import Rect
+
+from . import trace
+from .clustering import group_nearby_rects, pack_regions
+from .geometry import MyRect
+from .incremental import PreviousSummary, page_fingerprint, save_sidecar, source_entry
+from .layout import DEFAULT_DENSITY, layout_pages
+from .scan import SummaryCancelled, _check_cancelled, _report, find_all_annots_in_pdf
+from .search import SearchIndex, nearby_page_text
+from .store import as_store
+from .writer import ReusedPages, write_pages, write_summary
+
+
+class NoMatchingAnnotations(ValueError):
+    """Raised by ``summarize`` when the filters leave nothing to summarize."""
+
+
+def open_document(file_path):
+    return pymupdf.open(file_path)
+
+
+def default_output_path(file_path):
+    path = Path(file_path)
+    return str(path.with_name(path.stem + "_summary.pdf"))
+
+
+def parse_page_filter(page_filter_text):
+    """Parse ``"2-6, 9, 12-16"`` into a set of page numbers, or ``"all"`` when blank."""
+    if not page_filter_text or "e.g." in page_filter_text:
+        return "all"
+
+    page_filter = set()
+    for statement in page_filter_text.split(","):
+        statement = statement.strip()
+        if not statement:
+            continue
+        if "-" in statement:
+            low, high = statement.split("-", 1)
+            page_filter.update(range(int(low), int(high) + 1))
+        else:
+            page_filter.add(int(statement))
+
+    return page_filter
+
+
+def filter_annots(doc_annots, authors=None, pages="all", search=None, doc=None, cancel=None):
+    """Keep annotations by one of ``authors`` (None for everyone) on ``pages``, as an ``AnnotationStore``.
+
+    ``search`` further keeps the comments whose contents or subject match it
+    (see ``search``); with ``doc`` the page text near each annotation is
+    searched too.
+    """
+    with trace.span("filter", annots=len(doc_annots)):
+        store = as_store(doc_annots)
+        positions = store.select_positions(authors=authors, pages=pages)
+        if search is not None:
+            positions = _search_positions(store, positions, search, doc, cancel)
+        return store.take(positions)
+
+
+def _search_positions(store, positions, search, doc, cancel):
+    candidates = store.take(positions)
+    nearby = nearby_page_text(doc, candidates, cancel=cancel) if doc is not None else None
+    index = SearchIndex(candidates, nearby)
+    try:
+        found = index.search(search)
+    finally:
+        index.close()
+    if found is None:
+        return positions
+    return [positions[found_position] for found_position in found]
+
+
+def _page_regions(annots, positions, page_rect):
+    # Group together annotations that are close to each other
+    bboxes = [annots.bbox(position) for position in positions]
+    with trace.span("regions.group", annots=len(positions)):
+        groups = group_nearby_rects(bboxes)
+
+    # Make boundary rects that include all annots within their boundaries
+    boundary_rects = []
+    for group in groups:
+        surrounding_rect = MyRect(bboxes[group[0]])
+        for i in group[1:]:
+            surrounding_rect = surrounding_rect.include_rect(bboxes[i])
+        boundary_rects.append(surrounding_rect.expand_rect())
+
+    # Pack the groups into as few printable screenshot regions as possible
+    with trace.span("regions.pack", groups=len(boundary_rects)):
+        screenshot_rects = pack_regions(boundary_rects, page_rect)
+
+    # Make a dictionary containing all the annotations and key information for this page
+    screenshot_dict = {rect: {"annot_ids": [], "authors": set(), "last_modified": None, "portrait": True} for rect in screenshot_rects}
+
+    for position, bbox in zip(positions, bboxes):
+        bbox = Rect(bbox)
+        timestamp = annots.timestamp[position]
+        for screenshot_rect, info in screenshot_dict.items():
+            if bbox.intersects(screenshot_rect):
+                info["annot_ids"].append(annots.ids[position])
+                info["authors"].add(annots.author_name(position))
+
+                # Dates are compared as timestamps and only the latest is turned back into a datetime
+                if not math.isnan(timestamp) and (info["last_modified"] is None or timestamp > info["last_modified"][0]):
+                    info["last_modified"] = (timestamp, position)
+
+                if screenshot_rect.width > screenshot_rect.height:
+                    info["portrait"] = False
+
+    for info in screenshot_dict.values():
+        if info["last_modified"] is not None:
+            info["last_modified"] = annots.last_modified(info["last_modified"][1])
+
+    return screenshot_dict
+
+
+def iter_regions(doc, filtered_annots, page_rects, progress=None, cancel=None):
+    """Work out the screenshot rects for each page holding a filtered annotation, one page at a time.
+
+    Yields ``(page_no, page_label, screenshot_dict)`` tuples where
+    ``screenshot_dict`` maps each clip rect to the ids, authors, latest
+    modification date and orientation of the annotations it shows.
+
+    Everything comes from the records themselves (an ``AnnotationStore`` or a
+    list of record dicts), so the source pages aren't loaded again; ``doc``
+    is no longer read and is only kept so existing callers work unchanged.
+    """
+    annots = as_store(filtered_annots)
+    positions_by_page = annots.positions_by_page()
+    total_pages = len(positions_by_page)
+
+    for page_index, (page_number, positions) in enumerate(positions_by_page.items()):
+        _check_cancelled(cancel)
+        _report(progress, "regions", page_index, total_pages)
+
+        with trace.span("regions.page", page=page_number):
+            screenshot_dict = _page_regions(annots, positions, page_rects[page_number])
+        trace.count("regions", len(screenshot_dict))
+        yield page_number, annots.page_label(positions[0]), screenshot_dict
+
+    _report(progress, "regions", total_pages, total_pages)
+
+
+def generate_regions(doc, filtered_annots, page_rects, progress=None, cancel=None):
+    """``iter_regions`` as a list."""
+    return list(iter_regions(doc, filtered_annots, page_rects, progress=progress, cancel=cancel))
+
+
+def write_incremental_summary(doc, filtered_annots, page_rects, output_path, progress=None, cancel=None, **write_options):
+    """``write_summary`` for the regions of ``filtered_annots``, reusing what it can of the summary already at ``output_path``.
+
+    Summary pages showing only regions of source pages unchanged since the
+    existing summary was written are copied from it; the rest are laid out
+    and rendered as usual. The sidecar is rewritten for the new summary, so
+    the next run can do the same. While writing, the existing summary is kept
+    as ``<output_path>.previous`` and is put back if writing fails or is
+    cancelled. See ``incremental``.
+    """
+    output_path = str(output_path)
+    annots = as_store(filtered_annots)
+    positions_by_page = annots.positions_by_page()
+    with trace.span("incremental.fingerprint", pages=len(positions_by_page)):
+        fingerprints = {page_no: page_fingerprint(doc, annots, page_no, positions, page_rects[page_no])
+                        for page_no, positions in positions_by_page.items()}
+
+    previous = PreviousSummary(output_path, write_options, fingerprints)
+    previous_path = output_path + ".previous"
+    source = None
+    if previous.reusable:
+        os.replace(output_path, previous_path)
+        source = open_document(previous_path)
+
+    options = dict(write_options)
+    density = options.pop("density", DEFAULT_DENSITY)
+    sources = dict()
+    tile_keys = []
+
+    def regions():
+        # Regions are cheap next to rendering, so they are worked out for reused pages too
+        for page_no, page_label, screenshot_dict in iter_regions(doc, annots, page_rects, cancel=cancel):
+            sources[page_no] = source_entry(fingerprints[page_no], page_label, list(screenshot_dict))
+            yield page_no, page_label, screenshot_dict
+
+    def reuse(tile):
+        page_index = previous.match(tile)
+        if page_index is None:
+            return None
+        return ReusedPages(source, page_index, len(previous.tile_keys[page_index]))
+
+    def summary_pages():
+        for summary_page in layout_pages(regions(), density, reuse):
+            if isinstance(summary_page, ReusedPages):
+                tile_keys.append(previous.tile_keys[summary_page.page_index])
+                trace.count("incremental.reused")
+            else:
+                tile_keys.append([tile.key for tile in summary_page.tiles])
+            yield summary_page
+
+    try:
+        write_pages(doc, summary_pages(), output_path, progress=progress, cancel=cancel, total=len(positions_by_page), **options)
+    except BaseException:
+        if source is not None:
+            source.close()
+            os.replace(previous_path, output_path)
+        raise
+
+    if source is not None:
+        source.close()
+        os.remove(previous_path)
+    save_sidecar(output_path, write_options, sources, tile_keys)
+    return output_path
+
+
+def summarize(file_path, output_path=None, authors=None, pages="all", progress=None, cancel=None, workers=1, cache=None,
+              incremental=False, search=None, search_nearby=False, **write_options):
+    """Run the whole pipeline on ``file_path`` and return the path of the summary PDF.
+
+    ``cache`` is an optional ``AnnotationCache`` used to skip re-scanning an
+    unchanged file. With ``incremental`` the summary already at
+    ``output_path`` is updated with ``write_incremental_summary`` rather than
+    rebuilt. Given ``search``, only the comments matching it are summarized
+    (``search_nearby`` looks at the page text around them too). ``write_options`` (``mode``, ``dpi``, ``image_format``,
+    ``jpeg_quality``, ``chunk_pages``, ``density``) are passed on to ``write_summary``.
+    """
+    if output_path is None:
+        output_path = default_output_path(file_path)
+
+    with trace.span("summarize", file=str(file_path)):
+        return _summarize(file_path, output_path, authors, pages, progress, cancel, workers, cache, incremental,
+                          search, search_nearby, write_options)
+
+
+def _summarize(file_path, output_path, authors, pages, progress, cancel, workers, cache, incremental, search, search_nearby,
+               write_options):
+    doc = open_document(file_path)
+    try:
+        doc_annots, page_rects = find_all_annots_in_pdf(doc, progress=progress, cancel=cancel, cache=cache)
+        filtered_annots = filter_annots(doc_annots, authors=authors, pages=pages, search=search,
+                                        doc=doc if search_nearby else None, cancel=cancel)
+        if not filtered_annots:
+            raise NoMatchingAnnotations(f"No annotations in {file_path} match the selected filters.")
+        if incremental:
+            return write_incremental_summary(doc, filtered_annots, page_rects, output_path, progress=progress, cancel=cancel,
+                                             workers=workers, **write_options)
+        # Regions are worked out as the writer asks for them, so neither is held whole
+        total_pages = len(filtered_annots.pages())
+        regions = iter_regions(doc, filtered_annots, page_rects, cancel=cancel)
+        return write_summary(doc, regions, output_path, progress=progress, cancel=cancel, total=total_pages,
+                             workers=workers, **write_options)
+    finally:
+        doc.close()
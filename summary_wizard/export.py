@@ -0,0 +1,221 @@
+"""Writing annotation records out as a comment log, without rendering anything.
+
+Rows are written one record at a time as CSV, JSON Lines or XLSX, so memory
+stays flat however many comments a set has. ``export_annotations`` streams
+records straight from the scan of a document; ``export_records`` writes any
+iterable of records, such as the filtered ``AnnotationStore`` the wizard
+already holds.
+
+The XLSX writer builds the workbook with ``zipfile`` directly. The sheet is
+streamed into the archive with inline strings, so nothing has to be kept
+for a shared string table.
+"""
+import csv
+import json
+import os
+import re
+import zipfile
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from . import trace
+from .engine import open_document
+from .filtering import FilterCriteria, color_hex
+from .scan import _check_cancelled, _report, iter_annotations
+
+EXPORT_FORMATS = ("csv", "jsonl", "xlsx")
+EXPORT_COLUMNS = ("page_no", "page_label", "author", "color", "last_modified", "content", "subject", "x0", "y0", "x1", "y1", "id")
+
+_SUFFIXES = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".xlsx": "xlsx"}
+
+# Rows between progress reports
+PROGRESS_EVERY = 1000
+
+
+def export_format_for(path):
+    """The export format implied by ``path``'s suffix."""
+    suffix = Path(path).suffix.lower()
+    if suffix not in _SUFFIXES:
+        raise ValueError(f"Cannot tell the export format from {path!r}; use .csv, .jsonl or .xlsx")
+    return _SUFFIXES[suffix]
+
+
+def default_export_path(file_path, export_format="csv"):
+    path = Path(file_path)
+    return str(path.with_name(f"{path.stem}_annotations.{export_format}"))
+
+
+def export_row(record):
+    """One record as a tuple of ``EXPORT_COLUMNS`` values."""
+    last_modified = record["last_modified"]
+    x0, y0, x1, y1 = record["bbox"]
+    return (
+        record["page_no"],
+        record["page_label"],
+        record["author"],
+        color_hex(record["stroke_color"]),
+        last_modified.isoformat() if last_modified is not None else None,
+        record.get("content"),
+        record.get("subject"),
+        round(x0, 2), round(y0, 2), round(x1, 2), round(y1, 2),
+        record["id"],
+    )
+
+
+class _CsvWriter:
+    def __init__(self, path):
+        # The byte order mark lets Excel open the file as UTF-8
+        self.file = open(path, "w", newline="", encoding="utf-8-sig")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(EXPORT_COLUMNS)
+
+    def write(self, row):
+        self.writer.writerow(["" if value is None else value for value in row])
+
+    def close(self):
+        self.file.close()
+
+
+class _JsonLinesWriter:
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, row):
+        self.file.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False))
+        self.file.write("\n")
+
+    def close(self):
+        self.file.close()
+
+
+_XLSX_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+</Types>"""
+
+_XLSX_ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+_XLSX_WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="Annotations" sheetId="1" r:id="rId1"/></sheets>
+</workbook>"""
+
+_XLSX_WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+</Relationships>"""
+
+_XLSX_SHEET_START = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>"""
+
+_XLSX_SHEET_END = "</sheetData></worksheet>"
+
+# Characters XML 1.0 does not allow, which occasionally turn up in pasted comments
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+# Excel refuses longer cell text, and more rows than this in a sheet
+XLSX_MAX_CELL_TEXT = 32767
+XLSX_MAX_ROWS = 1048576
+
+
+def _xlsx_cell(value):
+    if value is None:
+        return "<c/>"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"<c><v>{value}</v></c>"
+    text = escape(_XML_ILLEGAL.sub("", str(value))[:XLSX_MAX_CELL_TEXT])
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+class _XlsxWriter:
+    def __init__(self, path):
+        self.archive = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+        self.archive.writestr("[Content_Types].xml", _XLSX_CONTENT_TYPES)
+        self.archive.writestr("_rels/.rels", _XLSX_ROOT_RELS)
+        self.archive.writestr("xl/workbook.xml", _XLSX_WORKBOOK)
+        self.archive.writestr("xl/_rels/workbook.xml.rels", _XLSX_WORKBOOK_RELS)
+        # The sheet goes last since nothing else can be added while it is open
+        self.sheet = self.archive.open("xl/worksheets/sheet1.xml", "w")
+        self.sheet.write(_XLSX_SHEET_START.encode("utf-8"))
+        self.rows = 0
+        self.write(EXPORT_COLUMNS)
+
+    def write(self, row):
+        self.rows += 1
+        if self.rows > XLSX_MAX_ROWS:
+            raise ValueError(f"An Excel sheet holds at most {XLSX_MAX_ROWS} rows; export as CSV or JSON Lines instead")
+        self.sheet.write(("<row>" + "".join(_xlsx_cell(value) for value in row) + "</row>").encode("utf-8"))
+
+    def close(self):
+        try:
+            self.sheet.write(_XLSX_SHEET_END.encode("utf-8"))
+            self.sheet.close()
+        finally:
+            self.archive.close()
+
+
+_WRITERS = {"csv": _CsvWriter, "jsonl": _JsonLinesWriter, "xlsx": _XlsxWriter}
+
+
+def export_records(records, output_path, export_format=None, progress=None, cancel=None, total=None):
+    """Write ``records`` to ``output_path`` one row at a time and return how many were written.
+
+    ``export_format`` is one of ``EXPORT_FORMATS``, by default taken from the
+    suffix of ``output_path``. ``total`` is only used for progress and is
+    taken from ``len(records)`` when there is one. A partly written file is
+    removed if writing fails or is cancelled.
+    """
+    if export_format is None:
+        export_format = export_format_for(output_path)
+    if export_format not in _WRITERS:
+        raise ValueError(f"Unknown export format {export_format!r}, expected one of {', '.join(EXPORT_FORMATS)}")
+    if total is None and hasattr(records, "__len__"):
+        total = len(records)
+
+    written = 0
+    with trace.span("export", format=export_format):
+        writer = _WRITERS[export_format](output_path)
+        try:
+            for record in records:
+                writer.write(export_row(record))
+                written += 1
+                if written % PROGRESS_EVERY == 0:
+                    _check_cancelled(cancel)
+                    _report(progress, "export", written, total)
+        except BaseException:
+            writer.close()
+            os.remove(output_path)
+            raise
+        writer.close()
+
+    trace.count("export.rows", written)
+    _report(progress, "export", written, total if total is not None else written)
+    return written
+
+
+def export_annotations(file_path, output_path=None, export_format="csv", authors=None, pages="all", search=None,
+                       progress=None, cancel=None):
+    """Export the comment log of ``file_path`` straight from the scan and return ``(output_path, rows)``.
+
+    Records are filtered like ``summarize`` does and written as each page is
+    read, so nothing is rendered and only one page's records are in memory
+    at a time. ``search`` is matched against each record with the rules of
+    ``search``, without building an index.
+    """
+    if output_path is None:
+        output_path = default_export_path(file_path, export_format)
+
+    criteria = FilterCriteria(authors=authors, pages=pages, text=search)
+    doc = open_document(file_path)
+    try:
+        records = (record for record in iter_annotations(doc, progress=progress, cancel=cancel) if criteria.matches(record))
+        rows = export_records(records, output_path, export_format, cancel=cancel)
+    finally:
+        doc.close()
+    return output_path, rows
@@ -0,0 +1,192 @@
+"""Indexes over annotation records so filter changes don't walk every record.
+
+``AnnotationIndex`` keeps record positions by author, page, page label and
+stroke color, a sorted date column and a full-text ``search.SearchIndex`` of
+the comment text, and answers a ``FilterCriteria`` by intersecting the
+matching index entries. Records can keep arriving while the
+scan runs; ``add`` returns their positions so a caller can test just those
+against the current criteria with ``FilterCriteria.matches``.
+"""
+import bisect
+import datetime
+import math
+from collections import defaultdict
+
+from . import trace
+from .search import SearchIndex, parse_query, text_matches
+from .store import NO_COLOR_CODE, AnnotationStore
+
+NO_COLOR = "#FFFFFF"
+
+
+def _color_hex_code(code):
+    return NO_COLOR if code == NO_COLOR_CODE else f"#{code:06x}"
+
+
+def color_hex(stroke_color):
+    """``[r, g, b]`` floats (or an empty list) as a Tk colour string."""
+    if not stroke_color or len(stroke_color) < 3:
+        return NO_COLOR
+    r, g, b = (int(channel * 255) for channel in stroke_color[:3])
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+class FilterCriteria:
+    """What FilterAnnotations asks for. ``None`` (or ``"all"`` for pages) means no restriction.
+
+    ``date_from`` and ``date_to`` are aware datetimes and both ends are inclusive.
+    ``text`` is a search of the comment contents and subjects, see ``search``.
+    """
+
+    def __init__(self, authors=None, pages="all", labels=None, colors=None, date_from=None, date_to=None, text=None):
+        self.authors = set(authors) if authors else None
+        self.pages = pages
+        self.labels = set(labels) if labels else None
+        self.colors = set(colors) if colors else None
+        self.date_from = date_from
+        self.date_to = date_to
+        # A search without any words (blank, or only punctuation) is no restriction
+        self.terms = parse_query(text)
+        self.text = text if self.terms else None
+
+    def is_empty(self):
+        return (self.authors is None and self.pages == "all" and self.labels is None
+                and self.colors is None and self.date_from is None and self.date_to is None and self.text is None)
+
+    def matches(self, record):
+        if self.authors is not None and record["author"] not in self.authors:
+            return False
+        if self.pages != "all" and int(record["page_no"]) not in self.pages:
+            return False
+        if self.labels is not None and record["page_label"] not in self.labels:
+            return False
+        if self.colors is not None and color_hex(record["stroke_color"]) not in self.colors:
+            return False
+        if self.date_from is not None or self.date_to is not None:
+            last_modified = record["last_modified"]
+            if last_modified is None:
+                return False
+            if self.date_from is not None and last_modified < self.date_from:
+                return False
+            if self.date_to is not None and last_modified > self.date_to:
+                return False
+        if self.text is not None and not text_matches(self.terms, (record.get("content"), record.get("subject"))):
+            return False
+        return True
+
+
+class AnnotationIndex:
+    """Filter indexes over an ``AnnotationStore`` (``records``) that records can keep being added to."""
+
+    def __init__(self, records=()):
+        self.records = AnnotationStore()
+        self.by_author = defaultdict(list)
+        self.by_page = defaultdict(list)
+        self.by_label = defaultdict(list)
+        self.by_color = defaultdict(list)
+        self._dates = []
+        self._dates_sorted = True
+        self.search = SearchIndex()
+        self.add(records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, records):
+        """Index ``records`` (dicts or a store) and return the range of positions they were given."""
+        store = self.records
+        start = len(store)
+        store.extend(records)
+        for position in range(start, len(store)):
+            self.by_author[store.author_name(position)].append(position)
+            self.by_page[store.page_no[position]].append(position)
+            self.by_label[store.page_label(position)].append(position)
+            self.by_color[_color_hex_code(store.color[position])].append(position)
+
+            timestamp = store.timestamp[position]
+            if not math.isnan(timestamp):
+                self._dates.append((timestamp, position))
+                self._dates_sorted = False
+        self.search.add(store, range(start, len(store)))
+        return range(start, len(store))
+
+    def authors(self):
+        return sorted(self.by_author, key=lambda author: (author or "").lower())
+
+    def colors(self):
+        return sorted(self.by_color)
+
+    def labels(self):
+        return sorted(self.by_label)
+
+    def _date_positions(self, date_from, date_to):
+        if not self._dates_sorted:
+            self._dates.sort()
+            self._dates_sorted = True
+        low = 0 if date_from is None else bisect.bisect_left(self._dates, (date_from.timestamp(), -1))
+        high = len(self._dates) if date_to is None else bisect.bisect_right(self._dates, (date_to.timestamp(), len(self.records)))
+        return {position for _, position in self._dates[low:high]}
+
+    def query(self, criteria):
+        """Sorted positions of the records matching ``criteria``."""
+        with trace.span("filter.query", records=len(self.records)):
+            return self._query(criteria)
+
+    def _query(self, criteria):
+        if criteria.is_empty():
+            return list(range(len(self.records)))
+
+        candidates = None
+        for index, wanted in ((self.by_author, criteria.authors), (self.by_page, None if criteria.pages == "all" else criteria.pages),
+                              (self.by_label, criteria.labels), (self.by_color, criteria.colors)):
+            if wanted is None:
+                continue
+            positions = set()
+            for key in wanted:
+                positions.update(index.get(key, ()))
+            candidates = positions if candidates is None else candidates & positions
+            if not candidates:
+                return []
+
+        if criteria.date_from is not None or criteria.date_to is not None:
+            positions = self._date_positions(criteria.date_from, criteria.date_to)
+            candidates = positions if candidates is None else candidates & positions
+
+        if criteria.text is not None:
+            positions = self.search.search(criteria.terms)
+            if candidates is None:
+                return positions
+            candidates &= set(positions)
+
+        return sorted(candidates)
+
+    def select(self, positions):
+        """The records at ``positions`` as a new ``AnnotationStore``."""
+        return self.records.take(positions)
+
+
+def parse_date_filter(text, end_of_day=False):
+    """``"2025-03-14"`` as an aware local datetime at the start (or end) of that day; blank gives None."""
+    text = (text or "").strip()
+    if not text or text.startswith("e.g."):
+        return None
+    day = datetime.datetime.strptime(text, "%Y-%m-%d")
+    if end_of_day:
+        day = day.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return day.astimezone()
+
+
+def parse_label_filter(text):
+    """``"E101, E102"`` as a set of page labels; blank gives None."""
+    text = (text or "").strip()
+    if not text or text.startswith("e.g."):
+        return None
+    return {label.strip() for label in text.split(",") if label.strip()}
+
+
+def parse_search_filter(text):
+    """The search box's text, or None when it is blank or still shows its placeholder."""
+    text = (text or "").strip()
+    if not text or text.startswith("e.g."):
+        return None
+    return text
@@ -0,0 +1,36 @@
+from pymupdf import Point, Rect
+
+# Printable area of a Letter sheet with margins, in points
+MIN_PAPER_SIDE = 6.75 * 72
+MAX_PAPER_SIDE = 9.25 * 72
+
+
+def fits_on_printer_paper(width, height):
+    return (min(width, height) < MIN_PAPER_SIDE) and (max(width, height) < MAX_PAPER_SIDE)
+
+
+class MyRect(Rect):
+    def expand_rect(self, pix=18):
+        return MyRect(self[0] - pix, self[1] - pix, self[2] + pix, self[3] + pix)
+
+    def center(self):
+        return Point((self[0] + self[2]) / 2, (self[1] + self[3]) / 2)
+
+    def fits_on_printer_paper(self):
+        return fits_on_printer_paper(self.width, self.height)
+
+
+def merge_overlapping_rects(list_of_rects):
+    final_rects = [list_of_rects.pop()]
+
+    while len(list_of_rects) > 0:
+        current_rect = list_of_rects.pop()
+        sorted = False
+        for final_rect in final_rects:
+            if final_rect.intersects(current_rect):
+                final_rect = final_rect.include_rect(current_rect)
+                sorted = True
+        if not sorted:
+            final_rects.append(current_rect)
+
+    return final_rects
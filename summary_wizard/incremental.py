@@ -0,0 +1,172 @@
+"""Regenerating a summary after a review round without redoing the sheets that didn't change.
+
+Next to an incrementally written summary lies a sidecar JSON file
+(``<name>_summary.regions.json``) holding, for every summarized source page, a
+fingerprint of what its regions were made from and the regions themselves,
+and for every summary page the regions (as ``(page_no, image_number)``) it
+shows. On the next run a summary page whose regions all come from source
+pages with the same fingerprint is copied from the previous summary as it
+is; only the other pages are laid out and rendered again.
+
+Packed layouts (see ``layout``) fill each summary page from a given region
+on without looking back, so after a changed sheet the new summary falls back
+into step with the previous one at the next page boundary it meets: the page
+being filled is finished early and the old pages are reused from there.
+
+A page's fingerprint covers everything its summary pages show: every
+annotation on the page (the rendered clips include other authors' markup
+too, see ``scan.annots_fingerprint``), the page's content streams, its label
+and rect, and the filtered annotations that decide the regions and captions.
+A reused page must also start with the same region, clip for clip, that the
+new summary has just worked out. The
+previous summary is only trusted when the sidecar was written with the same
+layout options and the summary's size and modification time still match it.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from pymupdf import Rect
+
+from .layout import DEFAULT_DENSITY
+from .scan import _XREF_RE, annots_fingerprint
+
+SIDECAR_VERSION = 3
+
+# Write options that change what summary pages look like, with write_summary's defaults
+LAYOUT_DEFAULTS = {"mode": "raster", "dpi": 72, "image_format": "png", "jpeg_quality": 85, "density": DEFAULT_DENSITY}
+
+
+def sidecar_path(output_path):
+    path = Path(output_path)
+    return str(path.with_name(path.stem + ".regions.json"))
+
+
+def layout_options(write_options):
+    """The ``write_summary`` options a reused page must have been made with."""
+    return {name: write_options.get(name, default) for name, default in LAYOUT_DEFAULTS.items()}
+
+
+def _summary_stamp(output_path):
+    stat = os.stat(output_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _update_with_contents(digest, doc, page_number):
+    kind, value = doc.xref_get_key(doc.page_xref(page_number), "Contents")
+    for xref in _XREF_RE.findall(value):
+        xref = int(xref)
+        if doc.xref_is_stream(xref):
+            digest.update(doc.xref_stream_raw(xref))
+        else:
+            # An indirect array of content streams
+            for part in _XREF_RE.findall(doc.xref_object(xref, compressed=True)):
+                digest.update(doc.xref_stream_raw(int(part)) or b"")
+
+
+def _rounded(rect):
+    return [round(value, 3) for value in rect]
+
+
+def page_fingerprint(doc, annots, page_number, positions, page_rect=None):
+    """Hex digest of what the summary pages of ``page_number`` are made from.
+
+    ``positions`` are the filtered annotations on the page in the
+    ``AnnotationStore`` ``annots``; ``page_rect`` is the rect their regions
+    are clipped to.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(annots_fingerprint(doc, page_number).encode("utf-8", "surrogatepass"))
+    _update_with_contents(digest, doc, page_number)
+    sheet = (annots.page_label(positions[0]), None if page_rect is None else _rounded(page_rect))
+    digest.update(repr(sheet).encode("utf-8", "surrogatepass"))
+    for position in positions:
+        selected = (annots.bbox(position), annots.author_name(position), annots.timestamp[position], annots.utc_offset[position])
+        digest.update(repr(selected).encode("utf-8", "surrogatepass"))
+    return digest.hexdigest()
+
+
+class PreviousSummary:
+    """The pages of the summary at ``output_path`` that can be copied into a new one.
+
+    ``fingerprints`` maps each source page of the new summary, in order, to
+    its ``page_fingerprint``. A previous summary page can be reused when
+    every source page it shows is unchanged and those source pages still
+    follow one another in the new summary, so the tiles it holds are exactly
+    the next ones the new summary needs.
+    """
+
+    def __init__(self, output_path, write_options, fingerprints):
+        sidecar = _load_sidecar(output_path, write_options)
+        sources = {int(page_no): entry for page_no, entry in sidecar.get("sources", {}).items()}
+        unchanged = {page_no for page_no, fingerprint in fingerprints.items()
+                     if page_no in sources and sources[page_no]["fingerprint"] == fingerprint}
+
+        self.sources = sources
+        self.order = list(fingerprints)
+        self.source_index = {page_no: index for index, page_no in enumerate(self.order)}
+        self.tile_keys = [[tuple(key) for key in keys] for keys in sidecar.get("pages", [])]
+        # First tile -> page index, for the pages made only from unchanged source pages
+        self.reusable = {keys[0]: page_index for page_index, keys in enumerate(self.tile_keys)
+                         if keys and all(page_no in unchanged for page_no, _ in keys)}
+
+    def match(self, tile):
+        """The index of a previous page holding exactly the tiles from ``tile`` on, or None."""
+        page_index = self.reusable.get(tile.key)
+        if page_index is None:
+            return None
+        # The regions are worked out again for reused pages, so a page whose regions came out differently is redone
+        entry = self.sources[tile.page_no]
+        if entry["count"] != tile.image_count or entry["regions"][tile.image_number - 1] != _rounded(tile.clip):
+            return None
+        page_numbers = list(dict.fromkeys(page_no for page_no, _ in self.tile_keys[page_index]))
+        start = self.source_index[page_numbers[0]]
+        if self.order[start:start + len(page_numbers)] != page_numbers:
+            return None
+        return page_index
+
+
+def _load_sidecar(output_path, write_options):
+    try:
+        with open(sidecar_path(output_path), encoding="utf-8") as f:
+            sidecar = json.load(f)
+        stamp = _summary_stamp(output_path)
+    except (OSError, ValueError):
+        return dict()
+    if (not isinstance(sidecar, dict) or sidecar.get("version") != SIDECAR_VERSION
+            or sidecar.get("layout") != layout_options(write_options) or sidecar.get("summary") != stamp):
+        return dict()
+    return sidecar
+
+
+def save_sidecar(output_path, write_options, sources, pages):
+    """Record the ``sources`` entries and each page's tile keys for the summary just written to ``output_path``."""
+    sidecar = {
+        "version": SIDECAR_VERSION,
+        "layout": layout_options(write_options),
+        "summary": _summary_stamp(output_path),
+        "sources": {str(page_no): entry for page_no, entry in sources.items()},
+        "pages": [[list(key) for key in keys] for keys in pages],
+    }
+    # Written to the side and renamed like the batch manifest
+    path = sidecar_path(output_path)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(sidecar, f)
+    os.replace(temp_path, path)
+
+
+def source_entry(fingerprint, page_label, regions):
+    """One source page's sidecar entry; ``regions`` are its clip rects, in order.
+
+    Empty clips are left out, as ``layout.iter_tiles`` leaves them out, so
+    the entry's regions are numbered like the page's tiles.
+    """
+    regions = [_rounded(rect) for rect in regions if not Rect(rect).is_empty]
+    return {
+        "fingerprint": fingerprint,
+        "page_label": page_label,
+        "count": len(regions),
+        "regions": regions,
+    }
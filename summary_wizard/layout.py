@@ -0,0 +1,223 @@
+"""Laying screenshot regions out on Letter summary pages.
+
+Every region becomes a ``Tile``: the clip to show plus its three caption
+lines (page label and image number, authors, date). ``layout_pages`` places
+the tiles, in the order the regions come, on ``SummaryPage`` objects for the
+writer to draw. The ``density`` setting decides how:
+
+``single``
+    One region per page, portrait or landscape to suit the region, exactly
+    as summaries have always looked.
+``normal``
+    Regions at full size packed onto each page in rows, each with its
+    captions beneath it.
+``compact``
+    As ``normal`` with regions shown at 60% and smaller captions and gaps.
+
+Packed pages are filled one at a time: rows of tiles are added until the next
+tile no longer fits, trying the page both ways round and keeping whichever
+orientation takes more tiles. Tiles are never reordered, so the summary
+still reads in page order, and a page only depends on the tiles from its
+first one on, which is what lets ``incremental`` reuse pages of an earlier
+summary.
+"""
+import pymupdf
+from pymupdf import Rect
+
+DENSITIES = ("single", "normal", "compact")
+DEFAULT_DENSITY = "single"
+
+MARGIN = 36
+
+# Packed densities: (region scale, gap between tiles, caption font size, narrowest tile)
+_PACKED = {
+    "normal": (1.0, 18, 9, 144),
+    "compact": (0.6, 10, 7, 108),
+}
+
+
+class Tile:
+    """One screenshot region with its captions, and where the layout put it."""
+
+    def __init__(self, page_no, page_label, clip, info, image_number, image_count):
+        self.page_no = page_no
+        self.page_label = page_label
+        self.clip = clip
+        self.info = info
+        self.image_number = image_number
+        self.image_count = image_count
+        # Set by the layout: where the screenshot goes, and the baseline start of each caption line
+        self.target = None
+        self.caption_points = None
+        self.fontsize = 11
+        self.caption_width = None
+
+    @property
+    def key(self):
+        """``(page_no, image_number)``, which names the tile across runs."""
+        return self.page_no, self.image_number
+
+    @property
+    def is_last(self):
+        """Whether this is the last region of its source page."""
+        return self.image_number == self.image_count
+
+    def caption_lines(self):
+        last_modified = self.info["last_modified"]
+        date_text = last_modified.strftime('%Y-%m-%d') if last_modified is not None else "unknown"
+        return [
+            f"{self.page_label}, image {self.image_number} of {self.image_count}",
+            f"Annotation author: {', '.join(sorted(self.info['authors']))}",
+            f"Annotation date: {date_text}",
+        ]
+
+
+class SummaryPage:
+    """A summary page of ``width`` x ``height`` with its placed ``tiles``.
+
+    ``sources_done`` counts the source pages whose last region is on it, for
+    progress.
+    """
+
+    def __init__(self, width, height, tiles):
+        self.width = width
+        self.height = height
+        self.tiles = tiles
+        self.sources_done = sum(tile.is_last for tile in tiles)
+
+
+def iter_tiles(total_doc_screenshots):
+    """The regions of ``(page_no, page_label, screenshot_dict)`` items as ``Tile`` objects, in order.
+
+    Empty clips have nothing to render and are left out, numbering included.
+    """
+    for page_no, page_label, screenshot_dict in total_doc_screenshots:
+        regions = [(clip, info) for clip, info in screenshot_dict.items() if not Rect(clip).is_empty]
+        for image_number, (clip, info) in enumerate(regions, 1):
+            yield Tile(page_no, page_label, clip, info, image_number, len(regions))
+
+
+def _letter(portrait):
+    width, height = pymupdf.paper_sizes()['letter']
+    return (width, height) if portrait else (height, width)
+
+
+def _single_page(tile):
+    # The original one-region-per-page layout, captions pinned above the bottom margin
+    width, height = _letter(tile.info["portrait"])
+    tile.target = Rect((36, 36), tile.clip.width, tile.clip.height)
+    tile.caption_points = [(36, min(tile.clip.height + 20, height - 96)),
+                           (36, min(tile.clip.height + 40, height - 76)),
+                           (36, min(tile.clip.height + 60, height - 56))]
+    tile.fontsize = 11
+    tile.caption_width = None
+    return SummaryPage(width, height, [tile])
+
+
+def _fill(tiles, width, height, settings):
+    """Place as many of ``tiles`` as fit on one ``width`` x ``height`` page, as ``[(tile, target, caption_points)]``."""
+    scale, gap, fontsize, min_width = settings
+    line_height = fontsize * 1.25
+    caption_height = 3 * line_height + 2
+    left, top, right, bottom = MARGIN, MARGIN, width - MARGIN, height - MARGIN
+
+    placed = []
+    x, y, row_height = left, top, 0
+    for tile in tiles:
+        # Regions too big for the page at this scale are shrunk to fit with their captions
+        # (a degenerate clip counts as one point across rather than dividing by zero)
+        fit = min(scale, (right - left) / max(tile.clip.width, 1), (bottom - top - caption_height) / max(tile.clip.height, 1))
+        image_width, image_height = tile.clip.width * fit, tile.clip.height * fit
+        tile_width, tile_height = max(image_width, min_width), image_height + caption_height
+
+        if x > left and x + tile_width > right:
+            x, y, row_height = left, y + row_height + gap, 0
+        if y + tile_height > bottom:
+            break
+
+        target = Rect(x, y, x + image_width, y + image_height)
+        first_baseline = y + image_height + fontsize + 2
+        caption_points = [(x, first_baseline + line * line_height) for line in range(3)]
+        placed.append((tile, target, caption_points, tile_width))
+        x += tile_width + gap
+        row_height = max(row_height, tile_height)
+    return placed
+
+
+def _packed_page(tiles, settings):
+    # Both orientations are tried and the one taking more tiles wins; ties go to the first tile's own orientation
+    portrait = tiles[0].info["portrait"]
+    best_width, best_height = _letter(portrait)
+    best = _fill(tiles, best_width, best_height, settings)
+    other_width, other_height = _letter(not portrait)
+    other = _fill(tiles, other_width, other_height, settings)
+    if len(other) > len(best):
+        best, best_width, best_height = other, other_width, other_height
+
+    page_tiles = []
+    for tile, target, caption_points, tile_width in best:
+        tile.target = target
+        tile.caption_points = caption_points
+        tile.fontsize = settings[2]
+        tile.caption_width = tile_width
+        page_tiles.append(tile)
+    return SummaryPage(best_width, best_height, page_tiles)
+
+
+def layout_pages(total_doc_screenshots, density=DEFAULT_DENSITY, reuse=None):
+    """Lay the regions of ``total_doc_screenshots`` out on summary pages and yield them in order.
+
+    ``total_doc_screenshots`` is any iterable of ``(page_no, page_label,
+    screenshot_dict)`` and is read only as far as the page being laid out
+    needs. ``reuse(tile)`` may return a ``writer.ReusedPages`` to use instead
+    of laying out a new page from ``tile`` on; the page being filled is then
+    finished early, the ``ReusedPages`` is yielded and the ``tile_count``
+    tiles it stands for are skipped.
+    """
+    if density not in DENSITIES:
+        raise ValueError(f"Unknown density {density!r}, expected one of {', '.join(DENSITIES)}")
+    settings = _PACKED.get(density)
+    tiles = iter_tiles(total_doc_screenshots)
+
+    # Tiles read ahead while filling a page, with what ``reuse`` said about each
+    pending = []
+
+    def fill_pending(count):
+        while len(pending) < count:
+            tile = next(tiles, None)
+            if tile is None:
+                return False
+            pending.append((tile, reuse(tile) if reuse is not None else None))
+        return True
+
+    def skip(reused):
+        # The tiles a reused page stands for are dropped unread
+        fill_pending(reused.tile_count)
+        reused.sources_done = sum(tile.is_last for tile, _ in pending[:reused.tile_count])
+        del pending[:reused.tile_count]
+
+    while fill_pending(1):
+        tile, reused = pending[0]
+        if reused is not None:
+            skip(reused)
+            yield reused
+            continue
+        if settings is None:
+            del pending[0]
+            yield _single_page(tile)
+            continue
+
+        # Candidates stop at the next tile that starts a reused page; a page holds at most this many
+        candidates = []
+        while fill_pending(len(candidates) + 1):
+            tile, reused = pending[len(candidates)]
+            if candidates and reused is not None:
+                break
+            candidates.append(tile)
+            if len(candidates) % 32 == 0 and len(_fill(candidates, *_letter(True), settings)) < len(candidates) \
+                    and len(_fill(candidates, *_letter(False), settings)) < len(candidates):
+                break
+
+        page = _packed_page(candidates, settings)
+        del pending[:len(page.tiles)]
+        yield page
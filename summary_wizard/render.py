@@ -0,0 +1,186 @@
+"""Rasterizing screenshot clips, either in this process or across a process pool.
+
+Every clip is turned into PNG bytes whichever path renders it, so a summary
+written with ``workers=8`` is identical to one written with ``workers=1``.
+Each worker process opens the source PDF itself, once, when the pool starts
+it; only the file path, clip coordinates and the encoded images cross the
+process boundary.
+
+Each source page is interpreted once into a display list and every clip on it
+is cropped from that, rather than re-parsing the page for each clip. A small
+LRU of display lists, kept for the life of each worker, bounds memory on huge
+sheets.
+
+Raster clips are encoded as PNG (lossless, deflate) or JPEG. The vector mode
+skips rasterizing altogether: ``baked_copy`` gives pages whose annotations are
+part of the page content, ready to be placed with ``Page.show_pdf_page``.
+"""
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import pymupdf
+
+from . import trace
+
+# Jobs handed to one worker call. Large enough that pickling the jobs and
+# results is cheap next to the rendering, small enough that the pool stays
+# balanced when some sheets are much denser than others.
+JOBS_PER_CHUNK = 16
+
+# Display lists kept at once. Jobs arrive grouped by page, so this only needs
+# to cover the odd page that comes round again.
+DISPLAY_LIST_CACHE_SIZE = 2
+
+RENDER_MODES = ("raster", "vector")
+IMAGE_FORMATS = ("png", "jpeg")
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+class DisplayListCache:
+    """Page number -> ``pymupdf.DisplayList`` for ``doc``, keeping the ``max_pages`` most recently used."""
+
+    def __init__(self, doc, max_pages=DISPLAY_LIST_CACHE_SIZE):
+        self.doc = doc
+        self.max_pages = max(1, max_pages)
+        self._lists = OrderedDict()
+
+    def get(self, page_no):
+        if page_no in self._lists:
+            self._lists.move_to_end(page_no)
+        else:
+            self._lists[page_no] = self.doc[page_no].get_displaylist()
+            while len(self._lists) > self.max_pages:
+                self._lists.popitem(last=False)
+        return self._lists[page_no]
+
+    def clear(self):
+        self._lists.clear()
+
+
+def render_clip(source, clip, dpi=72, image_format="png", jpeg_quality=85):
+    """Encoded image of ``clip`` from a page or display list, as ``page.get_pixmap(clip=clip, dpi=dpi)`` renders it."""
+    zoom = dpi / 72
+    pix = source.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), clip=clip)
+    pix.set_dpi(dpi, dpi)
+    if image_format == "jpeg":
+        return pix.tobytes("jpeg", jpg_quality=jpeg_quality)
+    return pix.tobytes("png")
+
+
+def _render_jobs(doc, jobs, dpi, image_format, jpeg_quality):
+    display_lists = DisplayListCache(doc)
+    try:
+        for page_no, clip in jobs:
+            yield render_clip(display_lists.get(page_no), clip, dpi, image_format, jpeg_quality)
+    finally:
+        display_lists.clear()
+
+
+# A pool worker's own copy of the document and its display lists, set up by ``_init_worker``.
+# They last as long as the worker, so a page split across chunks is only interpreted once.
+_worker_doc = None
+_worker_display_lists = None
+
+
+def _init_worker(file_path):
+    global _worker_doc, _worker_display_lists
+    _worker_doc = pymupdf.open(file_path)
+    _worker_display_lists = DisplayListCache(_worker_doc)
+
+
+def _render_chunk(jobs, dpi, image_format, jpeg_quality):
+    return [render_clip(_worker_display_lists.get(page_no), clip, dpi, image_format, jpeg_quality) for page_no, clip in jobs]
+
+
+def baked_copy(doc, page_numbers):
+    """Copy ``page_numbers`` of ``doc`` into a new document with their annotations baked into the content.
+
+    ``show_pdf_page`` only carries page content across, so annotations have to
+    become content first. Returns ``(baked_doc, positions)`` where
+    ``positions`` maps each source page number to its index in ``baked_doc``.
+    """
+    baked = pymupdf.open()
+    positions = dict()
+    for page_no in sorted(set(page_numbers)):
+        baked.insert_pdf(doc, from_page=page_no, to_page=page_no)
+        positions[page_no] = baked.page_count - 1
+    baked.bake(annots=True, widgets=True)
+    return baked, positions
+
+
+def _chunks(jobs, size):
+    for start in range(0, len(jobs), size):
+        yield jobs[start:start + size]
+
+
+class ClipRenderer:
+    """Renders batches of ``(page_no, clip)`` jobs from ``doc``, keeping one process pool across batches.
+
+    With more than one worker the jobs are rendered by a process pool whose
+    workers each open ``doc.name`` from disk once; otherwise they are
+    rendered lazily from ``doc``. The pool is started by the first batch big
+    enough to need it and lives until ``close``.
+    """
+
+    def __init__(self, doc, workers=1, dpi=72, image_format="png", jpeg_quality=85):
+        self.doc = doc
+        self.workers = workers
+        self.options = (dpi, image_format, jpeg_quality)
+        self._executor = None
+
+    def render(self, jobs):
+        """Yield the encoded image for each job, in order."""
+        jobs = [(page_no, tuple(clip)) for page_no, clip in jobs]
+        images = self._render(jobs)
+        try:
+            while True:
+                # Timed per image since rendering happens as the writer asks for them
+                with trace.span("render.clip"):
+                    image = next(images, None)
+                if image is None:
+                    return
+                trace.count("render.clips")
+                trace.count("render.bytes", len(image))
+                yield image
+        finally:
+            images.close()
+
+    def _render(self, jobs):
+        if self.workers <= 1 or len(jobs) < 2 or not self.doc.name:
+            yield from _render_jobs(self.doc, jobs, *self.options)
+            return
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                 initargs=(self.doc.name,))
+
+        size = max(1, min(JOBS_PER_CHUNK, len(jobs) // self.workers))
+        futures = [self._executor.submit(_render_chunk, chunk, *self.options) for chunk in _chunks(jobs, size)]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            # Also reached when the consumer stops early (cancel), so drop queued work
+            for future in futures:
+                future.cancel()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+def iter_rendered_clips(doc, jobs, workers=1, dpi=72, image_format="png", jpeg_quality=85):
+    """Yield the encoded image for each ``(page_no, clip)`` in ``jobs``, in order.
+
+    A one-off ``ClipRenderer`` batch; see there for how ``workers`` is used.
+    """
+    renderer = ClipRenderer(doc, workers, dpi, image_format, jpeg_quality)
+    try:
+        yield from renderer.render(jobs)
+    finally:
+        renderer.close()
@@ -0,0 +1,243 @@
+"""Reading annotation records out of a PDF.
+
+A record is a plain dict with the layout ``{"page_no", "page_label", "id",
+"author", "stroke_color", "last_modified", "content", "subject", "bbox"}``.
+Records hold no live pymupdf objects, so they can be cached, pickled or sent
+between threads.
+
+Most sheets in a drawing set carry no markup, so pages are first checked for
+an ``/Annots`` entry in the xref table and only loaded when they have one.
+Records are produced by generators so callers can start using them while the
+rest of the document is still being read.
+"""
+import datetime
+import re
+from collections.abc import Mapping
+
+import pymupdf
+
+from . import trace
+from .store import AnnotationStore
+
+_XREF_RE = re.compile(r"(\d+)\s+\d+\s+R")
+
+
+class SummaryCancelled(Exception):
+    """Raised inside a pipeline stage once its ``cancel`` event has been set."""
+
+
+def _report(progress, stage, done, total):
+    if progress is not None:
+        progress(stage, done, total)
+
+
+def _check_cancelled(cancel):
+    if cancel is not None and cancel.is_set():
+        raise SummaryCancelled()
+
+
+def parse_pdf_date(pdf_date):
+    """Turn a PDF date string (``D:20240131120000-08'00'``) into a datetime, or None."""
+    try:
+        return datetime.datetime.strptime(pdf_date.replace("'", ""), r"D:%Y%m%d%H%M%S%z")
+    except (AttributeError, ValueError):
+        return None
+
+
+def _annots_array(doc, page_number):
+    kind, value = doc.xref_get_key(doc.page_xref(page_number), "Annots")
+    if kind == "xref":
+        return doc.xref_object(int(value.split()[0]), compressed=True)
+    if kind == "array":
+        return value
+    return ""
+
+
+def page_has_annots(doc, page_number):
+    """Whether the page's ``/Annots`` array lists anything, without loading the page."""
+    return _XREF_RE.search(_annots_array(doc, page_number)) is not None
+
+
+def annots_fingerprint(doc, page_number):
+    """A string that changes whenever the page's annotations are added, removed, moved or edited.
+
+    Only the page's ``/Annots`` array and each annotation's ``/M`` and
+    ``/Rect`` entries are read, straight from the xref table, so this is far
+    cheaper than loading the page. Pages without annotations give ``""``.
+    """
+    value = _annots_array(doc, page_number)
+    xrefs = _XREF_RE.findall(value)
+    if not xrefs:
+        return ""
+
+    parts = [value]
+    for xref in xrefs:
+        xref = int(xref)
+        parts.append(doc.xref_get_key(xref, "M")[1])
+        parts.append(doc.xref_get_key(xref, "Rect")[1])
+    return "|".join(parts)
+
+
+def page_labeller(doc):
+    """``label(page_number)``, giving what ``Page.get_label`` does without loading the page."""
+    labels = sorted(doc._get_page_labels())
+    if not labels:
+        return lambda page_number: ""
+    return lambda page_number: pymupdf.utils.get_label_pno(page_number, labels)
+
+
+def sheet_key(doc, page_number, page_label):
+    """What decides a page's label and rect, which ``annots_fingerprint`` leaves out.
+
+    The CropBox comes from the xref table like the annotations, so the page
+    isn't loaded; ``/Rotate`` is only read from the page itself, not
+    inherited from its parents.
+    """
+    rotation = doc.xref_get_key(doc.page_xref(page_number), "Rotate")[1]
+    return f"{page_label}|{tuple(doc.page_cropbox(page_number))}|{rotation}"
+
+
+class PageRects(Mapping):
+    """Page number -> page rect, loading a page only the first time its rect is asked for.
+
+    Rects of pages the scan already loaded are handed in through ``known``.
+    """
+
+    def __init__(self, doc, known=None):
+        self.doc = doc
+        self._rects = dict(known or {})
+
+    def __getitem__(self, page_number):
+        if page_number not in self._rects:
+            if not 0 <= page_number < self.doc.page_count:
+                raise KeyError(page_number)
+            self._rects[page_number] = self.doc[page_number].rect
+        return self._rects[page_number]
+
+    def __setitem__(self, page_number, rect):
+        self._rects[page_number] = rect
+
+    def __iter__(self):
+        return iter(range(self.doc.page_count))
+
+    def __len__(self):
+        return self.doc.page_count
+
+
+def scan_page(doc, page_number):
+    """Load one page and return ``(page_label, page_rect, records)``."""
+    with trace.span("scan.page", page=page_number):
+        return _scan_page(doc, page_number)
+
+
+def _scan_page(doc, page_number):
+    page = doc[page_number]
+    page_label = page.get_label()
+
+    records = []
+    for annot in page.annots():
+        annot_dict = dict()
+        annot_dict["page_no"] = page_number
+        annot_dict["page_label"] = page_label
+        annot_dict["id"] = annot.info['id']
+        annot_dict["author"] = annot.info['title']
+        annot_dict["stroke_color"] = annot.colors['stroke']
+        annot_dict["last_modified"] = parse_pdf_date(annot.info['modDate'])
+        annot_dict["content"] = annot.info['content']
+        annot_dict["subject"] = annot.info['subject']
+        annot_dict["bbox"] = tuple(annot.apn_bbox)
+
+        records.append(annot_dict)
+
+    return page_label, page.rect, records
+
+
+def iter_annotated_pages(doc, progress=None, cancel=None, previous_pages=None):
+    """Yield ``(page_no, annots_key, page_label, page_rect, records)`` for each annotated page.
+
+    Pages without annotations are skipped at the xref level. With
+    ``previous_pages`` (as returned by ``AnnotationCache.load_pages``) a page
+    whose ``annots_fingerprint`` and ``sheet_key`` are unchanged is taken
+    from there instead of being loaded; without it ``annots_key`` is None.
+    """
+    total_pages = doc.page_count
+    label = page_labeller(doc) if previous_pages is not None else None
+
+    for page_number in range(total_pages):
+        _check_cancelled(cancel)
+        _report(progress, "scan", page_number, total_pages)
+
+        if previous_pages is None:
+            if not page_has_annots(doc, page_number):
+                continue
+            annots_key = None
+        else:
+            annots_key = annots_fingerprint(doc, page_number)
+            if not annots_key:
+                continue
+            # A relabelled or re-cropped sheet is read again even when its markup is unchanged
+            annots_key = f"{annots_key}|{sheet_key(doc, page_number, label(page_number))}"
+            previous = previous_pages.get(page_number)
+            if previous is not None and previous[0] == annots_key:
+                trace.count("scan.pages_reused")
+                yield (page_number, *previous)
+                continue
+
+        page_label, page_rect, records = scan_page(doc, page_number)
+        trace.count("scan.pages_loaded")
+        trace.count("scan.annotations", len(records))
+        yield page_number, annots_key, page_label, page_rect, records
+
+    _report(progress, "scan", total_pages, total_pages)
+
+
+def iter_annotations(doc, progress=None, cancel=None):
+    """Yield annotation records one at a time as the document is read."""
+    for _, _, _, _, records in iter_annotated_pages(doc, progress=progress, cancel=cancel):
+        yield from records
+
+
+def find_all_annots_in_pdf(doc, progress=None, cancel=None, cache=None, on_page=None):
+    """Collect one record per annotation in ``doc``.
+
+    Returns ``(doc_annots, page_rects)`` where ``doc_annots`` is an
+    ``AnnotationStore`` and ``page_rects`` a ``PageRects`` mapping. With an ``AnnotationCache`` an unchanged file is
+    answered straight from the cache, and a changed one only re-scans the
+    pages whose annotations differ from the cached copy. ``on_page(records)``
+    is called with each annotated page's records as soon as they are known.
+    """
+    with trace.span("scan", pages=doc.page_count):
+        return _find_all_annots_in_pdf(doc, progress, cancel, cache, on_page)
+
+
+def _find_all_annots_in_pdf(doc, progress, cancel, cache, on_page):
+    total_pages = doc.page_count
+
+    previous_pages = None
+    file_key = None
+    if cache is not None and doc.name:
+        file_key = cache.file_key(doc.name)
+        cached = cache.load_document(file_key)
+        if cached is not None:
+            doc_annots, known_rects = cached
+            if on_page is not None and doc_annots:
+                on_page(doc_annots)
+            _report(progress, "scan", total_pages, total_pages)
+            return doc_annots, PageRects(doc, known_rects)
+        previous_pages = cache.load_pages(file_key)
+
+    total_doc_annots = AnnotationStore()
+    page_rects = PageRects(doc)
+    scanned_pages = dict()
+
+    for page_number, annots_key, page_label, page_rect, records in iter_annotated_pages(doc, progress, cancel, previous_pages):
+        page_rects[page_number] = page_rect
+        scanned_pages[page_number] = (annots_key, page_label, page_rect, records)
+        total_doc_annots.extend(records)
+        if on_page is not None and records:
+            on_page(records)
+
+    if file_key is not None:
+        cache.store(file_key, scanned_pages)
+
+    return total_doc_annots, page_rects
@@ -0,0 +1,148 @@
+"""Full-text search over what comments say, backed by an SQLite FTS5 table.
+
+Reviewers look for comments by their text: "RFI", "clash", a gridline such
+as "C-4". ``SearchIndex`` keeps the contents and subjects of an
+``AnnotationStore``'s records, and optionally the page text around each
+annotation (see ``nearby_page_text``), in an in-memory FTS5 table whose
+rowids are the records' positions. A query therefore comes back as positions,
+ready for ``AnnotationStore.take`` or to intersect with the other filters.
+Rows are added as records arrive, so the index is built while the scan runs
+and a query over tens of thousands of comments takes milliseconds.
+
+Queries are plain text, not FTS5 syntax: every word must appear, as a word or
+the start of one ("clas" finds "clash"), and a "quoted phrase" must appear
+as written. Words are runs of letters and digits, compared without case or
+accents, so "C-4" is the phrase "c 4". ``text_matches`` applies the same
+rules to a single record, for code that streams records instead of indexing
+them.
+"""
+import re
+import sqlite3
+import unicodedata
+
+from . import trace
+from .scan import _check_cancelled
+
+# How far around an annotation, in points, page text counts as nearby
+NEARBY_MARGIN = 36
+
+_TERM_RE = re.compile(r'"([^"]*)"?|(\S+)')
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+def _fold(text):
+    # No case, no compatibility forms ("ﬁ" is "fi"), no combining marks
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def words(text):
+    """The words of ``text`` as the index sees them."""
+    return _WORD_RE.findall(_fold(text)) if text else []
+
+
+def _indexed(text):
+    # The index is given the words already folded, so it and ``text_matches`` agree on
+    # what a word is; unicode61 on its own keeps "ß" and "ﬁ" and would miss "strasse" or "fire"
+    return " ".join(words(text)) if text else None
+
+
+def parse_query(text):
+    """``text`` as a list of ``(words, prefix)`` terms; quoted phrases are matched whole, bare words as prefixes."""
+    terms = []
+    for match in _TERM_RE.finditer(text or ""):
+        phrase, bare = match.groups()
+        term_words = words(phrase if bare is None else bare)
+        if term_words:
+            terms.append((tuple(term_words), bare is not None))
+    return terms
+
+
+def match_expression(terms):
+    """The FTS5 ``MATCH`` expression for ``parse_query`` terms; words are letters and digits only, so quoting is safe."""
+    return " AND ".join(f'"{" ".join(term_words)}"' + ("*" if prefix else "") for term_words, prefix in terms)
+
+
+def _has_phrase(text_words, term_words, prefix):
+    count = len(term_words)
+    for start in range(len(text_words) - count + 1):
+        if text_words[start:start + count - 1] != list(term_words[:-1]):
+            continue
+        last = text_words[start + count - 1]
+        if last == term_words[-1] or (prefix and last.startswith(term_words[-1])):
+            return True
+    return False
+
+
+def text_matches(terms, texts):
+    """Whether every ``parse_query`` term is in one of ``texts`` (strings or None)."""
+    fields = [words(text) for text in texts if text]
+    return all(any(_has_phrase(field, term_words, prefix) for field in fields) for term_words, prefix in terms)
+
+
+def nearby_page_text(doc, annots, positions_by_page=None, margin=NEARBY_MARGIN, cancel=None):
+    """``{position: text}`` of the words on the page within ``margin`` of each annotation in ``annots``.
+
+    Extracting the text of a drawing is much slower than reading its
+    annotations, so this is only done when asked for.
+    """
+    if positions_by_page is None:
+        positions_by_page = annots.positions_by_page()
+    nearby = dict()
+    with trace.span("search.nearby_text", pages=len(positions_by_page)):
+        for page_no, positions in positions_by_page.items():
+            _check_cancelled(cancel)
+            page_words = doc[page_no].get_text("words")
+            for position in positions:
+                x0, y0, x1, y1 = annots.bbox(position)
+                x0, y0, x1, y1 = x0 - margin, y0 - margin, x1 + margin, y1 + margin
+                found = [word[4] for word in page_words if word[0] < x1 and word[2] > x0 and word[1] < y1 and word[3] > y0]
+                if found:
+                    nearby[position] = " ".join(found)
+    return nearby
+
+
+class SearchIndex:
+    """FTS5 index of the comment text of ``AnnotationStore`` records, keyed by position.
+
+    Like ``AnnotationCache`` it holds an ``sqlite3`` connection, so use it
+    on the thread that created it.
+    """
+
+    def __init__(self, annots=None, nearby=None):
+        self.connection = sqlite3.connect(":memory:")
+        self.connection.execute(
+            "CREATE VIRTUAL TABLE comments USING fts5(content, subject, nearby, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        self.size = 0
+        if annots is not None:
+            self.add(annots, range(len(annots)), nearby)
+
+    def __len__(self):
+        return self.size
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, annots, positions, nearby=None):
+        """Index the records at ``positions`` of the store ``annots``; ``nearby`` is ``nearby_page_text`` output."""
+        nearby = nearby or dict()
+        contents = annots.contents
+        subjects = annots.subjects
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO comments (rowid, content, subject, nearby) VALUES (?, ?, ?, ?)",
+                ((position, _indexed(contents[position]), _indexed(subjects[position]), _indexed(nearby.get(position)))
+                 for position in positions),
+            )
+        self.size += len(positions)
+
+    def search(self, query):
+        """Sorted positions of the records matching ``query`` (text, or ``parse_query`` terms); None when it has no words."""
+        terms = parse_query(query) if isinstance(query, str) else query
+        if not terms:
+            return None
+        with trace.span("search.query", records=self.size):
+            return [position for position, in self.connection.execute(
+                "SELECT rowid FROM comments WHERE comments MATCH ? ORDER BY rowid", (match_expression(terms),)
+            )]
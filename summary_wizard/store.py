@@ -0,0 +1,212 @@
+"""Annotation records kept column by column instead of one dict each.
+
+A record dict with its datetime, bbox tuple and colour list costs close to a
+kilobyte; a drawing set with a few hundred thousand annotations spends most
+of its memory on them. ``AnnotationStore`` keeps each field in a typed
+``array`` instead: page number, bbox corners, stroke colour packed into one
+integer, modification time as a POSIX timestamp with its UTC offset, and
+author and page label as codes into interned tables. Only the ids, comment
+text and subjects stay Python strings.
+
+A store is a sequence of record dicts (``store[i]`` builds the dict when it
+is asked for), so code written against lists of records keeps working. The
+pipeline itself reads the columns directly, which is what makes grouping
+and region building cheap: bboxes and dates come out of the store rather
+than from reloading the page's annotations and parsing their date strings.
+"""
+import datetime
+import math
+from array import array
+from collections.abc import Sequence
+
+NO_COLOR_CODE = -1
+
+
+def pack_color(stroke_color):
+    """``[r, g, b]`` floats as ``0xRRGGBB`` (each channel as ``color_hex`` rounds it), or ``NO_COLOR_CODE``."""
+    if not stroke_color or len(stroke_color) < 3:
+        return NO_COLOR_CODE
+    r, g, b = (int(channel * 255) for channel in stroke_color[:3])
+    return (r << 16) | (g << 8) | b
+
+
+def unpack_color(code):
+    """The inverse of ``pack_color``, as floats that ``color_hex`` turns back into the same string."""
+    if code == NO_COLOR_CODE:
+        return []
+    return [(code >> shift & 0xFF) / 255 for shift in (16, 8, 0)]
+
+
+class _Interned:
+    """Strings (or None) <-> small integer codes."""
+
+    def __init__(self, values=()):
+        self.values = []
+        self.codes = dict()
+        for value in values:
+            self.code(value)
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class AnnotationStore(Sequence):
+    """Columnar sequence of annotation records; see the module docstring."""
+
+    def __init__(self, records=()):
+        self.page_no = array("i")
+        self.x0 = array("d")
+        self.y0 = array("d")
+        self.x1 = array("d")
+        self.y1 = array("d")
+        self.color = array("l")
+        # NaN when the annotation has no (readable) modification date
+        self.timestamp = array("d")
+        self.utc_offset = array("i")
+        self.author = array("i")
+        self.label = array("i")
+        self.ids = []
+        self.contents = []
+        self.subjects = []
+
+        self.authors = _Interned()
+        self.labels = _Interned()
+        self._timezones = dict()
+        self.extend(records)
+
+    def __len__(self):
+        return len(self.page_no)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return self.take(range(len(self))[position])
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return {
+            "page_no": self.page_no[position],
+            "page_label": self.labels.values[self.label[position]],
+            "id": self.ids[position],
+            "author": self.authors.values[self.author[position]],
+            "stroke_color": unpack_color(self.color[position]),
+            "last_modified": self.last_modified(position),
+            "content": self.contents[position],
+            "subject": self.subjects[position],
+            "bbox": self.bbox(position),
+        }
+
+    def append(self, record):
+        self.append_values(record["page_no"], record["page_label"], record["id"], record["author"],
+                           record["stroke_color"], record["last_modified"], record.get("content"), record["bbox"],
+                           record.get("subject"))
+
+    def append_values(self, page_no, page_label, annot_id, author, stroke_color, last_modified, content, bbox, subject=None):
+        """``append`` for a record given field by field."""
+        self.page_no.append(int(page_no))
+        x0, y0, x1, y1 = bbox
+        self.x0.append(x0)
+        self.y0.append(y0)
+        self.x1.append(x1)
+        self.y1.append(y1)
+        self.color.append(pack_color(stroke_color))
+
+        if last_modified is None:
+            self.timestamp.append(math.nan)
+            self.utc_offset.append(0)
+        else:
+            self.timestamp.append(last_modified.timestamp())
+            offset = last_modified.utcoffset()
+            self.utc_offset.append(int(offset.total_seconds() // 60) if offset is not None else 0)
+
+        self.author.append(self.authors.code(author))
+        self.label.append(self.labels.code(page_label))
+        self.ids.append(annot_id)
+        self.contents.append(content)
+        self.subjects.append(subject)
+
+    def extend(self, records):
+        """Append every record in ``records``, which may be another store (copied column by column)."""
+        if not isinstance(records, AnnotationStore):
+            for record in records:
+                self.append(record)
+            return
+
+        for name in ("page_no", "x0", "y0", "x1", "y1", "color", "timestamp", "utc_offset"):
+            getattr(self, name).extend(getattr(records, name))
+        author_codes = [self.authors.code(value) for value in records.authors.values]
+        label_codes = [self.labels.code(value) for value in records.labels.values]
+        self.author.extend(author_codes[code] for code in records.author)
+        self.label.extend(label_codes[code] for code in records.label)
+        self.ids.extend(records.ids)
+        self.contents.extend(records.contents)
+        self.subjects.extend(records.subjects)
+
+    def take(self, positions):
+        """A new store holding the records at ``positions``, in that order."""
+        taken = AnnotationStore()
+        # Sharing the tables keeps the author and label codes valid as they are
+        taken.authors = self.authors
+        taken.labels = self.labels
+        for name in ("page_no", "x0", "y0", "x1", "y1", "color", "timestamp", "utc_offset", "author", "label"):
+            column = getattr(self, name)
+            getattr(taken, name).extend(column[position] for position in positions)
+        taken.ids = [self.ids[position] for position in positions]
+        taken.contents = [self.contents[position] for position in positions]
+        taken.subjects = [self.subjects[position] for position in positions]
+        return taken
+
+    def bbox(self, position):
+        return self.x0[position], self.y0[position], self.x1[position], self.y1[position]
+
+    def author_name(self, position):
+        return self.authors.values[self.author[position]]
+
+    def page_label(self, position):
+        return self.labels.values[self.label[position]]
+
+    def last_modified(self, position):
+        """The modification time as an aware datetime in its original UTC offset, or None."""
+        timestamp = self.timestamp[position]
+        if math.isnan(timestamp):
+            return None
+        offset = self.utc_offset[position]
+        timezone = self._timezones.get(offset)
+        if timezone is None:
+            timezone = self._timezones[offset] = datetime.timezone(datetime.timedelta(minutes=offset))
+        return datetime.datetime.fromtimestamp(timestamp, timezone)
+
+    def pages(self):
+        """Sorted page numbers holding at least one record."""
+        return sorted(set(self.page_no))
+
+    def positions_by_page(self):
+        """``{page_no: [positions]}`` with pages and positions in ascending order."""
+        by_page = dict()
+        for position, page_no in enumerate(self.page_no):
+            by_page.setdefault(page_no, []).append(position)
+        return dict(sorted(by_page.items()))
+
+    def select_positions(self, authors=None, pages="all"):
+        """Positions of the records by one of ``authors`` (None for everyone) on ``pages``."""
+        author_codes = None
+        if authors:
+            author_codes = {self.authors.codes[author] for author in authors if author in self.authors.codes}
+
+        positions = range(len(self))
+        if author_codes is not None:
+            author = self.author
+            positions = [position for position in positions if author[position] in author_codes]
+        if pages != "all":
+            page_no = self.page_no
+            positions = [position for position in positions if page_no[position] in pages]
+        return list(positions)
+
+
+def as_store(records):
+    """``records`` as an ``AnnotationStore``, converting a list of record dicts if need be."""
+    return records if isinstance(records, AnnotationStore) else AnnotationStore(records)
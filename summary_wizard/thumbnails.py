@@ -0,0 +1,151 @@
+"""Small page images for previewing regions, rendered off the GUI thread.
+
+``ThumbnailRenderer`` renders on its own thread, from its own copy of the
+document. PyMuPDF does not support being used from several threads at once,
+even with separate documents, so nothing else may use it while a renderer
+is open: the regions the preview shows are worked out from the stored
+records alone, and ``close`` waits for the thread to finish before the
+summary is rendered.
+
+The caller says which pages it wants with ``request``, normally the ones on
+screen and a few either side, and only those are rendered, in that order.
+Finished thumbnails go into a ``ThumbnailCache``, an LRU bounded by the bytes
+it holds rather than by a count, since a thumbnail of an ARCH E sheet and
+one of a Letter page differ a lot in size. Their page numbers are put on
+``ready`` for the GUI to pick up on its own thread.
+
+Thumbnails are binary PPM, which ``tk.PhotoImage`` reads without decoding
+work, and carry the zoom they were rendered at so regions can be drawn over
+them in page coordinates.
+"""
+import queue
+import threading
+from collections import OrderedDict
+
+import pymupdf
+
+from . import trace
+
+# Thumbnails are scaled to fit this box, in pixels
+THUMBNAIL_BOX = (360, 270)
+
+THUMBNAIL_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class Thumbnail:
+    def __init__(self, page_no, zoom, width, height, data):
+        self.page_no = page_no
+        self.zoom = zoom
+        self.width = width
+        self.height = height
+        self.data = data
+
+
+def render_thumbnail(doc, page_no, box=THUMBNAIL_BOX):
+    """``page_no`` of ``doc`` with its annotations, scaled to fit ``box``, as a ``Thumbnail``."""
+    page = doc[page_no]
+    zoom = min(box[0] / page.rect.width, box[1] / page.rect.height)
+    pix = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+    return Thumbnail(page_no, zoom, pix.width, pix.height, pix.tobytes("ppm"))
+
+
+class ThumbnailCache:
+    """Page number -> ``Thumbnail``, dropping the least recently used once over ``max_bytes``."""
+
+    def __init__(self, max_bytes=THUMBNAIL_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._thumbnails = OrderedDict()
+
+    def __len__(self):
+        return len(self._thumbnails)
+
+    def __contains__(self, page_no):
+        return page_no in self._thumbnails
+
+    def get(self, page_no):
+        thumbnail = self._thumbnails.get(page_no)
+        if thumbnail is not None:
+            self._thumbnails.move_to_end(page_no)
+        return thumbnail
+
+    def put(self, thumbnail):
+        old = self._thumbnails.pop(thumbnail.page_no, None)
+        if old is not None:
+            self.nbytes -= len(old.data)
+        self._thumbnails[thumbnail.page_no] = thumbnail
+        self.nbytes += len(thumbnail.data)
+        # The newest one always stays, even if it alone is over the limit
+        while self.nbytes > self.max_bytes and len(self._thumbnails) > 1:
+            _, dropped = self._thumbnails.popitem(last=False)
+            self.nbytes -= len(dropped.data)
+
+
+class ThumbnailRenderer:
+    """Renders thumbnails of ``file_path`` on a background thread; see the module docstring."""
+
+    def __init__(self, file_path, box=THUMBNAIL_BOX, max_bytes=THUMBNAIL_CACHE_BYTES):
+        self.file_path = file_path
+        self.box = box
+        self.cache = ThumbnailCache(max_bytes)
+        self.ready = queue.Queue()
+        # Pages that could not be rendered, so they aren't tried again
+        self.failed = set()
+
+        self._wanted = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def get(self, page_no):
+        """The cached thumbnail of ``page_no``, or None when it hasn't been rendered (or was dropped)."""
+        with self._condition:
+            return self.cache.get(page_no)
+
+    def request(self, page_numbers):
+        """Render ``page_numbers`` next, in this order, instead of whatever was asked for before."""
+        with self._condition:
+            self._wanted = list(page_numbers)
+            self._condition.notify()
+
+    def close(self):
+        """Stop rendering and wait until the thread has finished the thumbnail it is on and closed its document."""
+        with self._condition:
+            self._closed = True
+            self._wanted = []
+            self._condition.notify()
+        self.thread.join()
+
+    def _next_page(self):
+        while self._wanted:
+            page_no = self._wanted.pop(0)
+            if page_no not in self.cache and page_no not in self.failed:
+                return page_no
+        return None
+
+    def _run(self):
+        doc = pymupdf.open(self.file_path)
+        try:
+            while True:
+                with self._condition:
+                    page_no = self._next_page()
+                    while page_no is None and not self._closed:
+                        self._condition.wait()
+                        page_no = self._next_page()
+                    if self._closed:
+                        return
+
+                try:
+                    with trace.span("preview.thumbnail", page=page_no):
+                        thumbnail = render_thumbnail(doc, page_no, self.box)
+                except (RuntimeError, ValueError):
+                    with self._condition:
+                        self.failed.add(page_no)
+                else:
+                    trace.count("preview.thumbnail_bytes", len(thumbnail.data))
+                    with self._condition:
+                        self.cache.put(thumbnail)
+                self.ready.put(page_no)
+        finally:
+            doc.close()
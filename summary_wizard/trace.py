@@ -0,0 +1,137 @@
+"""Optional timing spans and counters for the pipeline stages.
+
+Tracing is off unless ``enable`` is called, which the command line does for
+``--trace`` and both front ends do when ``PDF_SUMMARY_TRACE`` names an output
+file. While it is off ``span`` hands back one shared do-nothing context
+manager and ``count`` returns straight away, so the instrumented code pays a
+function call and nothing else.
+
+Two output formats are written:
+
+``chrome``
+    Chrome trace event JSON, to open in ``chrome://tracing`` or Perfetto. Each
+    span is a complete ("X") event on the thread that ran it and each counter
+    a "C" event holding its running total.
+``summary``
+    ``{"spans": {name: {"count", "total_ms", "max_ms"}}, "counters": {...}}``,
+    small enough to diff between runs.
+
+Spans and counters are recorded in this process only. Screenshots rendered
+in a worker pool show up as the parent's ``render`` spans, and their sizes
+are still counted because the encoded images come back to the parent.
+"""
+import atexit
+import contextlib
+import json
+import os
+import threading
+import time
+
+TRACE_ENV = "PDF_SUMMARY_TRACE"
+TRACE_FORMAT_ENV = "PDF_SUMMARY_TRACE_FORMAT"
+TRACE_FORMATS = ("chrome", "summary")
+
+_NULL_SPAN = contextlib.nullcontext()
+_tracer = None
+
+
+class Tracer:
+    def __init__(self, path=None, trace_format="chrome"):
+        self.path = path
+        self.trace_format = trace_format
+        self.start_ns = time.perf_counter_ns()
+        self.pid = os.getpid()
+        self.spans = []
+        self.counters = dict()
+        self.counter_events = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name, args):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            self.spans.append((name, start - self.start_ns, end - start, threading.get_ident(), args))
+
+    def count(self, name, value):
+        with self._lock:
+            total = self.counters.get(name, 0) + value
+            self.counters[name] = total
+            self.counter_events.append((name, time.perf_counter_ns() - self.start_ns, total))
+
+    def chrome_events(self):
+        events = [{"name": name, "ph": "X", "ts": start / 1000, "dur": duration / 1000, "pid": self.pid, "tid": tid,
+                   "args": args or {}}
+                  for name, start, duration, tid, args in self.spans]
+        events.extend({"name": name, "ph": "C", "ts": timestamp / 1000, "pid": self.pid, "args": {name: total}}
+                      for name, timestamp, total in self.counter_events)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def summary(self):
+        spans = dict()
+        for name, _, duration, _, _ in self.spans:
+            entry = spans.setdefault(name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] += duration / 1e6
+            entry["max_ms"] = max(entry["max_ms"], duration / 1e6)
+        for entry in spans.values():
+            entry["total_ms"] = round(entry["total_ms"], 3)
+            entry["max_ms"] = round(entry["max_ms"], 3)
+        return {"spans": spans, "counters": dict(self.counters)}
+
+    def save(self, path, trace_format="chrome"):
+        data = self.summary() if trace_format == "summary" else self.chrome_events()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=None if trace_format == "chrome" else 2)
+
+
+def span(name, **args):
+    """Context manager timing the block as ``name``; ``args`` are shown with it in the Chrome trace."""
+    if _tracer is None:
+        return _NULL_SPAN
+    return _tracer.span(name, args)
+
+
+def count(name, value=1):
+    """Add ``value`` to the counter ``name``."""
+    if _tracer is not None:
+        _tracer.count(name, value)
+
+
+def is_enabled():
+    return _tracer is not None
+
+
+def enable(path, trace_format="chrome"):
+    """Start recording, and write the trace to ``path`` when ``finish`` is called or the process exits."""
+    global _tracer
+    if trace_format not in TRACE_FORMATS:
+        raise ValueError(f"Unknown trace format {trace_format!r}, expected one of {', '.join(TRACE_FORMATS)}")
+    finish()
+    _tracer = Tracer(path, trace_format)
+    atexit.register(finish)
+    return _tracer
+
+
+def enable_from_environment():
+    """``enable`` with the file named by ``PDF_SUMMARY_TRACE``, if it is set."""
+    path = os.environ.get(TRACE_ENV)
+    if not path:
+        return None
+    return enable(path, os.environ.get(TRACE_FORMAT_ENV) or "chrome")
+
+
+def finish():
+    """Stop recording and write the trace; does nothing when tracing is off."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return
+    atexit.unregister(finish)
+    try:
+        tracer.save(tracer.path, tracer.trace_format)
+    except OSError:
+        # A trace is a diagnostic; failing to write one mustn't fail the summary
+        pass
@@ -0,0 +1,249 @@
+"""Writing the summary PDF in bounded chunks.
+
+Regions are laid out on summary pages by ``layout``; this module draws those
+pages and saves them.
+
+A summary of a few thousand regions does not fit in memory as one pymupdf
+document, so ``SummaryWriter`` keeps at most ``chunk_pages`` new pages in
+memory. Each full chunk is appended to a work file next to the output with an
+incremental save, and the work file is reopened so the written pages are read
+back lazily instead of staying resident. ``close`` rewrites the work file
+with ``garbage`` and ``deflate`` into the final summary, which also drops the
+superseded objects the incremental saves leave behind. A summary that fits in
+one chunk is saved straight to the output.
+"""
+import os
+
+import pymupdf
+
+from . import trace
+from .layout import DEFAULT_DENSITY, layout_pages
+from .render import IMAGE_FORMATS, RENDER_MODES, ClipRenderer, baked_copy
+from .scan import _check_cancelled, _report
+
+# Summary pages built in memory before they are flushed to disk
+CHUNK_PAGES = 100
+
+
+def _fitted_text(text, fontsize, width):
+    # Packed captions are cut short rather than run into the next tile; no Helvetica glyph is wider than 1 em
+    if width is None or len(text) * fontsize <= width or pymupdf.get_text_length(text, fontsize=fontsize) <= width:
+        return text
+    while text and pymupdf.get_text_length(text + "...", fontsize=fontsize) > width:
+        text = text[:-1]
+    return text + "..."
+
+
+def _draw_captions(new_page, tiles):
+    # One shape for the page; separate insert_text calls would add a content stream per line
+    shape = new_page.new_shape()
+    for tile in tiles:
+        for point, text in zip(tile.caption_points, tile.caption_lines()):
+            shape.insert_text(point, _fitted_text(text, tile.fontsize, tile.caption_width), fontsize=tile.fontsize)
+    shape.commit()
+
+
+class ReusedPages:
+    """A page copied as it is from an earlier summary in place of laying out ``tile_count`` regions.
+
+    ``source`` is the open earlier summary and ``page_index`` the page to
+    copy; see ``incremental``. ``sources_done`` is filled in by the layout.
+    """
+
+    def __init__(self, source, page_index, tile_count):
+        self.source = source
+        self.page_index = page_index
+        self.tile_count = tile_count
+        self.sources_done = 0
+
+
+class SummaryWriter:
+    """Builds the summary at ``output_path`` from batches of regions without holding it all in memory.
+
+    Call ``write`` with each batch of laid out ``layout.SummaryPage`` objects
+    (and ``reuse`` with pages kept from an earlier summary), then ``close`` to
+    finish the file, or ``abort`` to throw it away.
+    See ``write_summary`` for the output options.
+    """
+
+    def __init__(self, doc, output_path, workers=1, mode="raster", dpi=72, image_format="png", jpeg_quality=85,
+                 chunk_pages=CHUNK_PAGES):
+        if mode not in RENDER_MODES:
+            raise ValueError(f"Unknown output mode {mode!r}, expected one of {', '.join(RENDER_MODES)}")
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format {image_format!r}, expected one of {', '.join(IMAGE_FORMATS)}")
+
+        self.doc = doc
+        self.output_path = str(output_path)
+        self.work_path = self.output_path + ".partial"
+        self.mode = mode
+        self.chunk_pages = max(1, chunk_pages)
+        self.renderer = ClipRenderer(doc, workers, dpi, image_format, jpeg_quality) if mode == "raster" else None
+
+        self.output = pymupdf.open()
+        self.pages_in_memory = 0
+        self.flushed = False
+
+    def write(self, summary_pages, cancel=None, on_page=None):
+        """Draw each of the laid out ``summary_pages``.
+
+        ``on_page(sources_done)`` is called after each page is drawn.
+        """
+        tiles = [tile for summary_page in summary_pages for tile in summary_page.tiles]
+        if self.mode == "vector":
+            page_numbers = sorted({tile.page_no for tile in tiles})
+            with trace.span("write.bake", pages=len(page_numbers)):
+                baked, baked_positions = baked_copy(self.doc, page_numbers)
+            images = iter(())
+        else:
+            baked = None
+            images = self.renderer.render([(tile.page_no, tile.clip) for tile in tiles])
+
+        try:
+            for summary_page in summary_pages:
+                _check_cancelled(cancel)
+                new_page = self.output.new_page(width=summary_page.width, height=summary_page.height)
+                _draw_captions(new_page, summary_page.tiles)
+                for tile in summary_page.tiles:
+                    if baked is not None:
+                        new_page.show_pdf_page(tile.target, baked, baked_positions[tile.page_no], clip=tile.clip)
+                    else:
+                        new_page.insert_image(tile.target, stream=next(images))
+                self.pages_in_memory += 1
+                trace.count("write.pages")
+
+                if on_page is not None:
+                    on_page(summary_page.sources_done)
+        finally:
+            # Drops queued render work if we stop early
+            if baked is not None:
+                baked.close()
+            else:
+                images.close()
+
+        if self.pages_in_memory >= self.chunk_pages:
+            self.flush()
+
+    def reuse(self, pages, cancel=None, on_page=None):
+        """Copy the ``ReusedPages`` ``pages`` into the summary instead of rendering it again."""
+        _check_cancelled(cancel)
+        with trace.span("write.reuse"):
+            self.output.insert_pdf(pages.source, from_page=pages.page_index, to_page=pages.page_index)
+        self.pages_in_memory += 1
+        trace.count("write.reused_pages")
+        if on_page is not None:
+            on_page(pages.sources_done)
+
+        if self.pages_in_memory >= self.chunk_pages:
+            self.flush()
+
+    def flush(self):
+        """Append the pages built so far to the work file and let go of them."""
+        if self.pages_in_memory == 0:
+            return
+        with trace.span("write.flush", pages=self.pages_in_memory):
+            self._flush()
+
+    def _flush(self):
+        # Without deflate pymupdf stores inserted images as raw pixels
+        if self.flushed:
+            self.output.save(self.work_path, incremental=True, encryption=pymupdf.PDF_ENCRYPT_KEEP, deflate=True)
+        else:
+            self.output.save(self.work_path, deflate=True)
+            self.flushed = True
+        self.output.close()
+        self.output = pymupdf.open(self.work_path)
+        self.pages_in_memory = 0
+
+    def close(self):
+        """Save the finished summary to ``output_path`` and return that path."""
+        try:
+            if self.flushed:
+                self.flush()
+            elif self.output.page_count == 0:
+                raise ValueError("No annotation lies within its page's visible area, so there is nothing to summarize.")
+            with trace.span("write.save"):
+                self.output.save(self.output_path, garbage=3, deflate=True)
+        finally:
+            self._release()
+        return self.output_path
+
+    def abort(self):
+        self._release()
+
+    def _release(self):
+        self.output.close()
+        if self.renderer is not None:
+            self.renderer.close()
+        if self.flushed and os.path.exists(self.work_path):
+            os.remove(self.work_path)
+
+
+def write_summary(doc, total_doc_screenshots, output_path, progress=None, cancel=None, total=None, density=DEFAULT_DENSITY,
+                  **options):
+    """Lay every screenshot region out on Letter pages, render them and save to ``output_path``.
+
+    ``total_doc_screenshots`` is any iterable of ``(page_no, page_label,
+    screenshot_dict)``, such as the generator ``iter_regions`` returns, so
+    regions can be worked out as the writer goes. ``total`` is the number of
+    items it will give, for progress, when it has no ``len``. ``density``
+    is one of ``layout.DENSITIES``: one region per page, or several packed
+    together.
+
+    In ``"raster"`` mode each region is rasterized at ``dpi`` and stored as
+    ``image_format`` (``"png"`` or ``"jpeg"``); ``workers`` greater than one
+    does the rasterizing in a process pool, with the same result. In
+    ``"vector"`` mode the region is placed as PDF content with its
+    annotations baked in, so nothing is rasterized at all. ``chunk_pages``
+    bounds how many summary pages are held in memory at once.
+    """
+    if total is None and hasattr(total_doc_screenshots, "__len__"):
+        total = len(total_doc_screenshots)
+    return write_pages(doc, layout_pages(total_doc_screenshots, density), output_path, progress, cancel, total, **options)
+
+
+def write_pages(doc, summary_pages, output_path, progress=None, cancel=None, total=None, **options):
+    """Draw and save laid out ``summary_pages``; see ``write_summary`` for the options.
+
+    ``summary_pages`` is an iterable of ``layout.SummaryPage`` and
+    ``ReusedPages`` objects. Progress is reported as the number of source
+    pages done out of ``total``.
+    """
+    writer = SummaryWriter(doc, output_path, **options)
+    done = 0
+
+    def page_written(sources_done):
+        nonlocal done
+        if sources_done:
+            done += sources_done
+            _report(progress, "write", done, total)
+
+    try:
+        _report(progress, "write", 0, total)
+        # Pages are batched so a render pool gets enough regions to share out
+        batch = []
+        batch_regions = 0
+        for summary_page in summary_pages:
+            if isinstance(summary_page, ReusedPages):
+                # Whatever is batched goes first to keep the pages in order
+                if batch:
+                    writer.write(batch, cancel, page_written)
+                    batch = []
+                    batch_regions = 0
+                writer.reuse(summary_page, cancel, page_written)
+                continue
+            batch.append(summary_page)
+            batch_regions += len(summary_page.tiles)
+            if batch_regions >= writer.chunk_pages:
+                writer.write(batch, cancel, page_written)
+                batch = []
+                batch_regions = 0
+        if batch:
+            writer.write(batch, cancel, page_written)
+        # Source pages whose markup all lies outside their CropBox had no regions to count
+        if total is not None and done < total:
+            _report(progress, "write", total, total)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.close()
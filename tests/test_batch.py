@@ -0,0 +1,108 @@
+"""run_batch: resuming from the manifest, and files whose worker process dies.
+
+``summarize`` is replaced with a stand-in that writes a placeholder output,
+so these run in well under a second. Worker processes only see the stand-in
+when they are forked from the test process.
+"""
+import multiprocessing
+import os
+
+import pytest
+
+from summary_wizard import batch
+
+
+def fake_summarize(file_path, output_path, progress=None, cancel=None, cache=None, **options):
+    if os.path.basename(file_path).startswith("crash"):
+        # What the OOM killer does to a worker: no exception, the process is just gone
+        os._exit(1)
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(repr(sorted(options.items())))
+    return output_path
+
+
+@pytest.fixture
+def inputs(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "summarize", fake_summarize)
+    folder = tmp_path / "in"
+    folder.mkdir()
+
+    def make(*names):
+        paths = []
+        for name in names:
+            path = folder / f"{name}.pdf"
+            path.write_bytes(b"%PDF-1.7\n")
+            paths.append(str(path))
+        return paths
+
+    return make
+
+
+def statuses(manifest):
+    return {os.path.basename(path): entry["status"] for path, entry in manifest["files"].items()}
+
+
+def test_resume_skips_finished_files(inputs, tmp_path):
+    paths = inputs("a", "b")
+    manifest_path = str(tmp_path / "manifest.json")
+    seen = []
+
+    batch.run_batch(paths, manifest_path, use_cache=False)
+    batch.run_batch(paths, manifest_path, use_cache=False, on_file=lambda path, entry: seen.append(path))
+    assert seen == []
+
+
+def test_resume_reruns_files_summarized_with_other_options(inputs, tmp_path):
+    paths = inputs("a", "b")
+    manifest_path = str(tmp_path / "manifest.json")
+    seen = []
+
+    batch.run_batch(paths, manifest_path, use_cache=False)
+    manifest = batch.run_batch(paths, manifest_path, use_cache=False, authors=["Alice"], density="compact",
+                               on_file=lambda path, entry: seen.append(path))
+    assert seen == paths
+    assert manifest["files"][paths[0]]["options"]["authors"] == ["Alice"]
+
+    seen.clear()
+    batch.run_batch(paths, manifest_path, use_cache=False, authors={"Alice"}, density="compact",
+                    on_file=lambda path, entry: seen.append(path))
+    assert seen == []
+
+
+def test_resume_reruns_changed_and_missing_outputs(inputs, tmp_path):
+    paths = inputs("a", "b")
+    manifest_path = str(tmp_path / "manifest.json")
+    batch.run_batch(paths, manifest_path, use_cache=False)
+
+    with open(paths[0], "ab") as f:
+        f.write(b"% edited\n")
+    os.remove(batch.batch_output_path(paths[1]))
+    seen = []
+    batch.run_batch(paths, manifest_path, use_cache=False, on_file=lambda path, entry: seen.append(path))
+    assert sorted(seen) == paths
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="workers must inherit the stand-in summarize")
+@pytest.mark.parametrize("jobs", [2, 3])
+def test_dead_worker_fails_only_its_file(inputs, tmp_path, jobs):
+    paths = inputs("f0", "crash1", "f2", "f3", "f4")
+    manifest = batch.run_batch(paths, str(tmp_path / "manifest.json"), jobs=jobs, use_cache=False)
+
+    assert statuses(manifest) == {"f0.pdf": "done", "crash1.pdf": "failed", "f2.pdf": "done", "f3.pdf": "done", "f4.pdf": "done"}
+    assert "died" in manifest["files"][paths[1]]["error"]
+    for path in paths[:1] + paths[2:]:
+        assert os.path.exists(batch.batch_output_path(path))
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="workers must inherit the stand-in summarize")
+def test_several_dead_workers(inputs, tmp_path):
+    paths = inputs("crash0", "f1", "crash2", "f3")
+    manifest = batch.run_batch(paths, str(tmp_path / "manifest.json"), jobs=2, use_cache=False)
+    assert statuses(manifest) == {"crash0.pdf": "failed", "f1.pdf": "done", "crash2.pdf": "failed", "f3.pdf": "done"}
+
+
+def test_file_with_brackets_is_not_a_pattern(inputs, tmp_path):
+    path, = inputs("A-101 [Rev C]")
+    assert not batch.is_batch_input(path)
+    assert batch.is_batch_input(str(tmp_path / "in"))
+    assert batch.is_batch_input(str(tmp_path / "in" / "*.pdf"))
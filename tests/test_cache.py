@@ -0,0 +1,53 @@
+"""Re-scanning a changed file with an AnnotationCache gives what a fresh scan gives."""
+import pymupdf
+
+from summary_wizard import AnnotationCache, find_all_annots_in_pdf
+
+
+def make_set(path, pages=3):
+    doc = pymupdf.open()
+    for page_no in range(pages):
+        page = doc.new_page(width=1200, height=900)
+        annot = page.add_rect_annot((100 + page_no, 100, 200, 160))
+        annot.set_info(title="Alice", content=f"RFI {page_no}")
+        annot.update()
+    doc.save(path)
+    doc.close()
+
+
+def edit(path, change):
+    doc = pymupdf.open(path)
+    change(doc)
+    doc.save(path, incremental=True, encryption=pymupdf.PDF_ENCRYPT_KEEP)
+    doc.close()
+
+
+def scan(path, cache=None):
+    doc = pymupdf.open(path)
+    try:
+        annots, page_rects = find_all_annots_in_pdf(doc, cache=cache)
+        return list(annots), {page_no: tuple(page_rects[page_no]) for page_no in annots.pages()}
+    finally:
+        doc.close()
+
+
+def test_relabelled_and_recropped_sheets_are_read_again(tmp_path):
+    path = str(tmp_path / "set.pdf")
+    make_set(path)
+    cache = AnnotationCache(tmp_path / "cache.sqlite")
+    try:
+        scan(path, cache)
+
+        def relabel_and_crop(doc):
+            doc.set_page_labels([{"startpage": 0, "prefix": "E-", "style": "D", "firstpagenum": 101}])
+            doc[1].set_cropbox(pymupdf.Rect(0, 0, 800, 600))
+
+        edit(path, relabel_and_crop)
+        cached = scan(path, cache)
+    finally:
+        cache.close()
+
+    fresh = scan(path)
+    assert cached == fresh
+    assert [record["page_label"] for record in cached[0]] == ["E-101", "E-102", "E-103"]
+    assert cached[1][1] == (0, 0, 800, 600)
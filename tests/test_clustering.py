@@ -0,0 +1,103 @@
+"""group_nearby_rects against the definition it implements.
+
+Two annotations are in the same group when their bboxes, each grown with
+``MyRect.expand_rect``, intersect; groups are the connected components of
+that relation. The reference below tests every pair, which is what the grid
+index in ``clustering`` avoids doing.
+
+Run from the repository root:
+
+    python -m pytest tests
+"""
+import random
+
+import pytest
+
+from summary_wizard import MyRect, group_nearby_rects
+
+
+def reference_groups(rects):
+    parent = list(range(len(rects)))
+
+    def find(i):
+        while parent[i] != i:
+            i = parent[i]
+        return i
+
+    expanded = [MyRect(r).expand_rect() for r in rects]
+    for i in range(len(rects)):
+        for j in range(i + 1, len(rects)):
+            if expanded[i].intersects(expanded[j]):
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    groups = dict()
+    for i in range(len(rects)):
+        groups.setdefault(find(i), []).append(i)
+    return [groups[root] for root in sorted(groups)]
+
+
+def random_layout(rng, count, width, height, max_size):
+    rects = []
+    for _ in range(count):
+        x0, y0 = rng.uniform(0, width), rng.uniform(0, height)
+        rects.append((x0, y0, x0 + rng.uniform(0, max_size), y0 + rng.uniform(0, max_size)))
+    return rects
+
+
+def clustered_layout(rng, count, width, height):
+    # Markup bunched around a few spots, like comments on a detail, plus the odd huge cloud
+    centres = [(rng.uniform(0, width), rng.uniform(0, height)) for _ in range(rng.randint(1, 6))]
+    rects = []
+    for _ in range(count):
+        cx, cy = rng.choice(centres)
+        x0, y0 = cx + rng.gauss(0, 60), cy + rng.gauss(0, 60)
+        size = rng.uniform(200, 800) if rng.random() < 0.05 else rng.uniform(0, 40)
+        rects.append((x0, y0, x0 + size, y0 + rng.uniform(0, 40)))
+    return rects
+
+
+def grid_layout(rng, count):
+    # Integer boxes whose gaps are often exactly twice the margin, so grown boxes only touch
+    rects = []
+    for _ in range(count):
+        x0, y0 = rng.randrange(0, 20) * 46, rng.randrange(0, 20) * 46
+        rects.append((x0, y0, x0 + 10, y0 + 10))
+    return rects
+
+
+def test_no_rects():
+    assert group_nearby_rects([]) == []
+
+
+def test_single_rect():
+    assert group_nearby_rects([(100, 100, 120, 130)]) == [[0]]
+
+
+def test_single_point_rect():
+    assert group_nearby_rects([(50, 50, 50, 50)]) == [[0]]
+
+
+def test_touching_grown_boxes_stay_apart():
+    # 36 pt apart: the boxes grown by 18 pt meet edge to edge, which does not count as intersecting
+    assert group_nearby_rects([(0, 0, 10, 10), (46, 0, 56, 10)]) == [[0], [1]]
+    assert group_nearby_rects([(0, 0, 10, 10), (45, 0, 55, 10)]) == [[0, 1]]
+
+
+def test_chain_is_one_group():
+    rects = [(i * 40, 0, i * 40 + 10, 10) for i in range(10)]
+    assert group_nearby_rects(rects) == [list(range(10))]
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_pairwise_reference(seed):
+    rng = random.Random(seed)
+    kind = seed % 3
+    if kind == 0:
+        rects = random_layout(rng, rng.randint(1, 120), rng.choice([612, 2592, 3456]), rng.choice([792, 1728, 2592]), 300)
+    elif kind == 1:
+        rects = clustered_layout(rng, rng.randint(1, 150), 3456, 2592)
+    else:
+        rects = grid_layout(rng, rng.randint(1, 120))
+    assert group_nearby_rects(rects) == reference_groups(rects)
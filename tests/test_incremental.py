@@ -0,0 +1,42 @@
+"""write_incremental_summary gives what a summary written from scratch gives."""
+import pymupdf
+
+from summary_wizard import summarize
+
+
+def make_set(path, pages=3):
+    doc = pymupdf.open()
+    for page_no in range(pages):
+        page = doc.new_page(width=1200, height=900)
+        page.insert_text((60, 80 + 40 * page_no), f"Sheet {page_no}", fontsize=24)
+        page.draw_rect((1000, 300, 1190, 500), color=(0, 0, 1), width=4)
+        # Close to the right edge, so cropping the sheet cuts the region short
+        annot = page.add_rect_annot((1040, 340, 1180, 460))
+        annot.set_info(title="Alice", content=f"RFI {page_no}")
+        annot.update()
+    doc.save(path)
+    doc.close()
+
+
+def page_images(path):
+    doc = pymupdf.open(path)
+    try:
+        return [(page.rect, page.get_text(), page.get_pixmap(dpi=36).samples) for page in doc]
+    finally:
+        doc.close()
+
+
+def test_recropped_sheet_is_not_reused(tmp_path):
+    path = str(tmp_path / "set.pdf")
+    make_set(path)
+    output = str(tmp_path / "set_summary.pdf")
+    summarize(path, output, incremental=True)
+
+    doc = pymupdf.open(path)
+    doc[1].set_cropbox(pymupdf.Rect(0, 0, 1100, 900))
+    doc.save(path, incremental=True, encryption=pymupdf.PDF_ENCRYPT_KEEP)
+    doc.close()
+
+    summarize(path, output, incremental=True)
+    fresh = summarize(path, str(tmp_path / "fresh.pdf"))
+    assert page_images(output) == page_images(fresh)
@@ -0,0 +1,45 @@
+"""Summaries rendered by a worker pool are the same, byte for byte, as ones rendered in this process."""
+import pymupdf
+import pytest
+
+from summary_wizard import summarize
+
+
+def make_set(path, pages=6, per_page=5):
+    doc = pymupdf.open()
+    for page_no in range(pages):
+        page = doc.new_page(width=1800, height=1200)
+        for line in range(20):
+            page.draw_line((50, 50 + 55 * line), (1750, 60 + 55 * line), color=(0, 0, line / 20), width=1 + line % 3)
+        page.insert_text((80, 1150), f"Sheet {page_no}", fontsize=30)
+        for i in range(per_page):
+            # Far enough apart that every annotation is its own region
+            x, y = 100 + 330 * i, 150 + 150 * (i % 4)
+            annot = page.add_rect_annot((x, y, x + 120 + 10 * page_no, y + 90))
+            annot.set_info(title=f"Reviewer {i % 2}", content=f"Comment {page_no}.{i}")
+            annot.update()
+    doc.save(path)
+    doc.close()
+
+
+def page_streams(path):
+    doc = pymupdf.open(path)
+    try:
+        return [(page.read_contents(), [doc.xref_stream_raw(image[0]) for image in page.get_images()]) for page in doc]
+    finally:
+        doc.close()
+
+
+@pytest.mark.parametrize("image_format", ["png", "jpeg"])
+@pytest.mark.parametrize("density", ["single", "normal"])
+def test_workers_give_identical_summaries(tmp_path, image_format, density):
+    path = str(tmp_path / "set.pdf")
+    make_set(path)
+    # A small chunk_pages sends several batches through the same pool
+    options = dict(image_format=image_format, density=density, chunk_pages=7, dpi=100)
+    serial = summarize(path, str(tmp_path / "serial.pdf"), workers=1, **options)
+    pooled = summarize(path, str(tmp_path / "pooled.pdf"), workers=4, **options)
+
+    serial_streams = page_streams(serial)
+    assert serial_streams and all(images for _, images in serial_streams)
+    assert page_streams(pooled) == serial_streams
@@ -0,0 +1,52 @@
+"""SearchIndex against text_matches, which must agree on every query.
+
+The index narrows ``AnnotationIndex`` queries while ``FilterCriteria.matches``
+checks records one at a time, so a word found by one and not the other makes
+the wizard's results depend on which path ran.
+"""
+import pytest
+
+from summary_wizard import AnnotationStore, SearchIndex, parse_query, text_matches
+
+CONTENTS = [
+    ("Straße to be widened", None),
+    ("strasse", "Note"),
+    ("ﬁre rating 2 HR", "Fire"),
+    ("FIRE DAMPER at grid C-4", None),
+    ("Café seating layout", "Review"),
+    ("Clash: duct vs beam", "Clash"),
+    ("Ⅻ hour rating", None),
+    ("İstanbul ﬂoor finish", None),
+    ("RFI-012 response", "RFI"),
+    ("", None),
+    (None, "Cloud"),
+]
+
+QUERIES = ["Straße", "strasse", "STRASSE", "fire", "ﬁre", "fi", "cafe", "Café", "c-4", '"grid c 4"', "clas",
+           "xii", "istanbul", "floor", "ﬂoor", "rfi 012", '"rfi 012"', "rating fire", "cloud", "note", "zzz"]
+
+
+@pytest.fixture(scope="module")
+def store():
+    annots = AnnotationStore()
+    for i, (content, subject) in enumerate(CONTENTS):
+        annots.append_values(0, "A-101", f"id{i}", "Reviewer", (1, 0, 0), None, content, (0, 0, 10, 10), subject=subject)
+    return annots
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_index_agrees_with_text_matches(store, query):
+    terms = parse_query(query)
+    index = SearchIndex(store)
+    expected = [position for position in range(len(store))
+                if text_matches(terms, (store.contents[position], store.subjects[position]))]
+    assert index.search(terms) == expected
+    index.close()
+
+
+def test_folded_spellings_are_found(store):
+    index = SearchIndex(store)
+    assert index.search("strasse") == [0, 1]
+    assert index.search("fire") == [2, 3]
+    assert index.search("floor") == [7]
+    index.close()